@@ -0,0 +1,119 @@
+import json
+import logging
+
+from urllib.parse import parse_qs
+
+from chatbot.nlp.async_query import AsyncQueryHandler
+
+
+# The endpoints served, answering the same way as the Flask app.
+RESPONSE_PATH = '/v2/response/'
+DIALOGFLOW_PATH = '/v1/dialogflow/response'
+
+handler = AsyncQueryHandler()
+
+
+async def _read_body(receive):
+    """ Reads the whole body of a request. """
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+
+async def _send_json(send, status, data):
+    """ Sends a complete response with a JSON body. """
+    body = json.dumps(data).encode('utf-8')
+    await send({'type': 'http.response.start',
+                'status': status,
+                'headers': [(b'content-type', b'application/json'),
+                            (b'content-length', str(len(body)).encode()),
+                            (b'access-control-allow-origin', b'*')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _response(scope, receive, send):
+    """ GET /v2/response/<query>/, answering a query from the chat. """
+    query = scope['path'][len(RESPONSE_PATH):]
+    if query.endswith('/'):
+        query = query[:-1]
+    if not query or '/' in query:
+        return await _send_json(send, 404, {'message': 'Not found'})
+
+    args = parse_qs(scope['query_string'].decode('latin-1'))
+    style = args.get('style', ['plain'])[0]
+    source = args.get('source', ['dev'])[0]
+
+    response = await handler.get_response(query, style, source)
+    await _send_json(send, 200, {'user_input': query, 'response': response,
+                                 'style': style})
+
+
+async def _dialogflow(scope, receive, send):
+    """ POST /v1/dialogflow/response, the fulfillment webhook of Dialogflow.
+    """
+    try:
+        request = json.loads((await _read_body(receive)).decode('utf-8'))
+        query = request['queryResult']['queryText']
+        if not isinstance(query, str):
+            raise TypeError('The query text must be a string')
+    except (ValueError, KeyError, TypeError):
+        return await _send_json(send, 400,
+                                {'message': 'Expected a Dialogflow request'})
+
+    response = await handler.get_response(query)
+    await _send_json(send, 200, {'fulfillmentText': response})
+
+
+async def _http(scope, receive, send):
+    """ Routes a request to its endpoint. """
+    path, method = scope['path'], scope['method']
+
+    if path.startswith(RESPONSE_PATH):
+        endpoint, allowed = _response, 'GET'
+    elif path == DIALOGFLOW_PATH:
+        endpoint, allowed = _dialogflow, 'POST'
+    else:
+        return await _send_json(send, 404, {'message': 'Not found'})
+
+    if method != allowed:
+        return await _send_json(send, 405, {'message': 'Method not allowed'})
+
+    try:
+        await endpoint(scope, receive, send)
+    except Exception:
+        logging.exception('Failed to answer {}'.format(path))
+        await _send_json(send, 500, {'message': 'Internal server error'})
+
+
+async def _lifespan(scope, receive, send):
+    """ Starts the query processes when the server starts, so that no request
+    waits for the models to load, and stops them when the server stops. """
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await handler.start()
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed',
+                            'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await handler.stop()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ An ASGI application serving the chat endpoints with asyncio. Each
+    server process waits on many requests at once, with the CPU work done by
+    the query processes of the handler. Run it with an ASGI server, e.g.
+    uvicorn chatbot.api.asgi:app """
+    if scope['type'] == 'lifespan':
+        await _lifespan(scope, receive, send)
+    elif scope['type'] == 'http':
+        await _http(scope, receive, send)
@@ -0,0 +1,22 @@
+import gc
+
+from chatbot.api.server import app
+from chatbot.nlp.query import load_models
+
+
+def freeze():
+    """ Moves every object allocated so far out of reach of the garbage
+    collector. Collections in the workers would otherwise write to the
+    objects shared with the master, which copies the pages they are on. """
+    gc.collect()
+    gc.freeze()
+
+
+# uWSGI imports this module once in the master, and forks the workers from
+# it, so the models are only loaded once and shared by every worker. Each
+# worker creates its own MongoDB client when it first uses the database.
+load_models()
+freeze()
+
+
+__all__ = ['app']
@@ -1,3 +1,8 @@
 #!/bin/bash
 service nginx start
-uwsgi --ini uwsgi.ini
+# Share the models between the workers if PRELOAD is set
+if [ "$PRELOAD" = "TRUE" ]; then
+    uwsgi --ini uwsgi_preload.ini
+else
+    uwsgi --ini uwsgi.ini
+fi
@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+from chatbot.api import asgi
+from chatbot.nlp.query import _perform_search
+from chatbot.nlp.test.evaluation import load_tests
+
+
+async def request(method, path, query_string=b'', body=b''):
+    ''' Sends a request to the ASGI app, returning the status and the JSON
+    body of the response. '''
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi.app({'type': 'http', 'method': method, 'path': path,
+                    'query_string': query_string, 'headers': []},
+                   receive, send)
+
+    return messages[0]['status'], json.loads(messages[1]['body'].decode())
+
+
+async def serve(requests):
+    ''' Starts the app, sends the requests at the same time and stops the
+    app again. '''
+    events = asyncio.Queue()
+    replies = asyncio.Queue()
+    lifespan = asyncio.ensure_future(
+        asgi.app({'type': 'lifespan'}, events.get, replies.put))
+
+    await events.put({'type': 'lifespan.startup'})
+    assert (await replies.get())['type'] == 'lifespan.startup.complete'
+
+    try:
+        return await asyncio.gather(*requests)
+    finally:
+        await events.put({'type': 'lifespan.shutdown'})
+        await replies.get()
+        await lifespan
+
+
+def test_asgi_responses():
+    questions = [question for test in load_tests()
+                 for question in test['question']]
+    expected = [_perform_search(question, 'plain') for question in questions]
+
+    dialogflow_body = json.dumps(
+        {'queryResult': {'queryText': questions[0]}}).encode()
+
+    results = asyncio.run(serve(
+        [request('GET', '/v2/response/{}/'.format(question))
+         for question in questions] +
+        [request('POST', '/v1/dialogflow/response', body=dialogflow_body),
+         request('POST', '/v1/dialogflow/response', body=b'{}'),
+         request('GET', '/v2/unknown/')]))
+
+    for question, answer, (status, body) in zip(questions, expected, results):
+        assert status == 200
+        assert body == {'user_input': question, 'response': answer,
+                        'style': 'plain'}
+
+    assert results[len(questions)] == (200, {'fulfillmentText': expected[0]})
+    assert results[len(questions) + 1][0] == 400
+    assert results[len(questions) + 2][0] == 404
+
+
+def test_asgi_response_style():
+    query = 'husleie'
+    expected = _perform_search(query, 'html')
+
+    (status, body), = asyncio.run(serve(
+        [request('GET', '/v2/response/{}/'.format(query),
+                 b'style=html&source=web')]))
+
+    assert status == 200
+    assert body['response'] == expected
+    assert body['style'] == 'html'
@@ -73,6 +73,10 @@ def create_intent_object(intent_name, training_phrases, match_entity=True):
         "parameters": []
     }
 
+    # Use the same entities for every phrase, even if they are reloaded by
+    # another thread in the meantime.
+    synonyms = entities
+
     parameters = []
     for training_phrase in training_phrases:
         parts = []
@@ -87,7 +91,7 @@ def create_intent_object(intent_name, training_phrases, match_entity=True):
                 # This is when we find an entity matching this specific word
                 # in the training phrase. Then we need to add entity type to
                 # the word and add the parameter to the intent.
-                entity = entities[word]
+                entity = synonyms[word]
                 parts.append(
                     {"text": word + " ", "entity_type": "@" + entity,
                      "alias": entity})
@@ -145,7 +149,9 @@ def get_entities():
     global entities_loaded
 
     global entities
-    entities = {}
+    # The entities are collected in a new dictionary, which replaces the old
+    # one at once, so that other threads never see it half filled.
+    loaded = {}
     client = dialogflow_v2beta1.EntityTypesClient()
     parent = client.project_agent_path(PROJECT_ID)
 
@@ -156,8 +162,9 @@ def get_entities():
             # Get every synonym.
             for synonym in entity.synonyms:
                 # Insert them into the big dictionary.
-                entities[synonym] = entity_type
+                loaded[synonym] = entity_type
 
+    entities = loaded
     entities_loaded = True
 
 
@@ -3,7 +3,9 @@ import json
 from flask import request, Blueprint
 
 from chatbot.model.model_factory import ModelFactory
+from chatbot.nlp.cache import invalidate_responses
 from chatbot.nlp.keyword import lemmatize_content_keywords
+from chatbot.nlp.search_model import mark_search_model_stale
 from chatbot.util.config_util import Config
 import chatbot.api.v1.util as flask_util
 
@@ -91,6 +93,13 @@ def update_content():
     # delete this document from the conflict ids collection
     query = {"conflict_id": id}
     factory.get_database().get_collection(conflict_col).delete_one(query)
+
+    # The search model has to reflect the manual content. It is rebuilt by
+    # a process of its own, as that takes a while on a large corpus.
+    mark_search_model_stale()
+
+    # Cached responses might contain the old content
+    invalidate_responses()
     return flask_util.create_success_response("Success")
 
 
@@ -121,6 +130,13 @@ def delete_manual_document():
            .update({"id": document_id}, {"$set": {"manually_changed": False}})
     factory.get_database().get_collection(conflict_col) \
                           .delete_one({"conflict_id": document_id})
+
+    # The search model has to reflect the manual content. It is rebuilt by
+    # a process of its own, as that takes a while on a large corpus.
+    mark_search_model_stale()
+
+    # Cached responses might contain the deleted content
+    invalidate_responses()
     success_msg = "Successfully deleted manual entry"
     return flask_util.create_success_response(success_msg)
 
@@ -1,9 +1,15 @@
 import chatbot.api.v2.models as models
 
+import flask
+import pymongo
+
 from flask_restplus import Namespace, Resource, fields, abort, reqparse
 
 from chatbot.model.model_factory import ModelFactory
+from chatbot.nlp.cache import ResponseCache, invalidate_responses
+from chatbot.nlp.search_model import mark_search_model_stale
 from chatbot.util.config_util import Config
+from chatbot.util.metrics import Metrics
 
 
 api = Namespace('v2', description='Chatbot APIv2')
@@ -25,6 +31,13 @@ response_model = api.model('Response', {
     'style': fields.String
 })
 
+queries_model = api.model('Queries', {
+    'queries': fields.List(fields.String, required=True,
+                           description='User chat inputs'),
+    'style': fields.String,
+    'source': fields.String
+})
+
 conflict_model = api.model('Conflict', {
     'id': fields.String(description='Document ID for conflict'),
     'title': fields.String(description='Title of conflict content')
@@ -65,7 +78,10 @@ content_collection_model = api.model('ContentCol', {
 })
 
 unknown_query_model = api.model('UnknownQuery', {
-    'query_text': fields.String
+    'query_text': fields.String,
+    'count': fields.Integer(description='How many times it was asked'),
+    'first_seen': fields.DateTime,
+    'last_seen': fields.DateTime
 })
 
 
@@ -89,6 +105,46 @@ class Response(Resource):
         return models.Response(query, style, source)
 
 
+class Responses(Resource):
+    @api.expect(queries_model)
+    @api.marshal_with(response_model)
+    @api.response(400, 'Queries must be a list of strings')
+    def post(self):
+        input_data = api.payload or {}
+        queries = input_data.get('queries')
+        style = input_data.get('style') or 'plain'
+        source = input_data.get('source') or 'dev'
+
+        if not isinstance(queries, list) or \
+                not all(isinstance(query, str) for query in queries):
+            abort(400, 'Queries must be a list of strings')
+
+        return models.get_responses(queries, style, source)
+
+
+explain_parser = reqparse.RequestParser()
+explain_parser.add_argument('style', required=False)
+explain_parser.add_argument('engine', required=False,
+                            choices=('mongo', 'bm25', 'lsa'),
+                            help='Retrieval engine, defaults to the setting')
+
+
+class Explain(Resource):
+    @api.expect(explain_parser)
+    def get(self, query):
+        # The explanation is free form, as the details depend on the engine.
+        args = explain_parser.parse_args()
+        return models.explain(query, args['style'] or 'plain', args['engine'])
+
+
+class MetricsText(Resource):
+    def get(self):
+        # Metrics are in the Prometheus text format rather than JSON.
+        cache_stats = ResponseCache.get_instance().get_stats()
+        return flask.Response(Metrics.get_instance().render(cache_stats),
+                              mimetype='text/plain; version=0.0.4')
+
+
 class ConflictIDs(Resource):
     @api.marshal_with(conflict_model)
     def get(self):
@@ -155,6 +211,13 @@ class Content(Resource):
         # Delete conflict if there was one
         factory.delete_document({'id': content_id}, conflict_col)
 
+        # The search model has to reflect the manual content. It is rebuilt
+        # by a process of its own, as that takes a while on a large corpus.
+        mark_search_model_stale()
+
+        # Cached responses might contain the deleted content
+        invalidate_responses()
+
         if result.deleted_count > 0:
             return result
         else:
@@ -205,17 +268,36 @@ class Content(Resource):
         query = {'id': content_id}
         factory.get_database().get_collection(conflict_col).delete_one(query)
 
+        # The search model has to reflect the manual content. It is rebuilt
+        # by a process of its own, as that takes a while on a large corpus.
+        mark_search_model_stale()
+
+        # Cached responses might contain the old content
+        invalidate_responses()
+
         if new_document['updatedExisting']:
             return input_data
 
 
+unknown_parser = reqparse.RequestParser()
+unknown_parser.add_argument('limit', type=int, required=False,
+                            help='Only return the most frequent queries')
+
+
 class UnknownQueries(Resource):
-    @api.marshal_with(unknown_query_model)
+    @api.marshal_with(unknown_query_model, skip_none=True)
+    @api.expect(unknown_parser)
     def get(self):
-        unknown_queries = factory.get_collection(unknown_col).find()
-        unknown_queries = [{'query_text': unknown_query['query_text']}
-                           for unknown_query in unknown_queries]
-        return unknown_queries
+        limit = unknown_parser.parse_args()['limit']
+
+        # The most frequent queries first, using the index on the count.
+        unknown_queries = factory.get_collection(unknown_col) \
+                                 .find({}, {'_id': 0}) \
+                                 .sort('count', pymongo.DESCENDING)
+        if limit:
+            unknown_queries = unknown_queries.limit(limit)
+
+        return list(unknown_queries)
 
     @api.marshal_with(delete_model)
     @api.response(200, 'Success', delete_model)
@@ -232,6 +314,10 @@ class UnknownQueries(Resource):
 api.add_resource(HelloWorld, '/', methods=['GET'])
 
 api.add_resource(Response, '/response/<string:query>/', methods=['GET'])
+api.add_resource(Responses, '/responses', methods=['POST'])
+api.add_resource(Explain, '/explain/<string:query>/', methods=['GET'])
+
+api.add_resource(MetricsText, '/metrics', methods=['GET'])
 
 api.add_resource(ConflictIDs, '/conflict_ids/', methods=['GET'])
 api.add_resource(ConflictIDs,
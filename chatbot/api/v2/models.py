@@ -5,13 +5,27 @@ handler = QueryHandler()
 
 
 class Response(object):
-    def __init__(self, user_input, style, source):
+    def __init__(self, user_input, style, source, response=None):
         self.user_input = user_input
-        self.response = handler.get_response(self.user_input, style, source)
+        self.response = response if response is not None \
+            else handler.get_response(self.user_input, style, source)
         self.style = style
         self.source = source
 
 
+def get_responses(user_inputs, style, source):
+    ''' Answers a list of user inputs in a single batch. '''
+    responses = handler.get_responses(user_inputs, style, source)
+    return [Response(user_input, style, source, response)
+            for user_input, response in zip(user_inputs, responses)]
+
+
+def explain(user_input, style, engine=None):
+    ''' Answers a user input without the cache, explaining how the response
+    was found. '''
+    return handler.explain(user_input, style, engine)
+
+
 class Conflict(object):
     def __init__(self, conflict_id, title):
         self.id = conflict_id
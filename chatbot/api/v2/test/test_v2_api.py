@@ -3,6 +3,7 @@ import json
 
 from chatbot.api import server
 from chatbot.model.model_factory import ModelFactory
+from chatbot.nlp.unknown_queries import UnknownQueryRecorder
 from chatbot.util.config_util import Config
 
 
@@ -34,6 +35,77 @@ def test_response(client):
         assert json.loads(response.data.decode())['user_input'] == query
     finally:
         factory.delete_document({'query_text': query}, conflict_col)
+        # Unknown queries are written in the background, so they have to be
+        # written before they can be deleted.
+        UnknownQueryRecorder.get_instance().flush()
+        factory.delete_document({'query_text': query}, unknown_col)
+
+
+def test_responses(client):
+    queries = ['some test response', 'another test response']
+    try:
+        response = client.post('/v2/responses',
+                               data=json.dumps({'queries': queries}),
+                               content_type='application/json')
+        assert response.status_code == 200
+
+        response_data = json.loads(response.data.decode())
+        assert [data['user_input'] for data in response_data] == queries
+
+        # The batch gives the same answers as asking one query at a time
+        for query, data in zip(queries, response_data):
+            single = client.get('/v2/response/{}/?style=plain'.format(query))
+            assert json.loads(single.data.decode())['response'] == \
+                data['response']
+    finally:
+        # Unknown queries are written in the background, so they have to be
+        # written before they can be deleted.
+        UnknownQueryRecorder.get_instance().flush()
+        for query in queries:
+            factory.delete_document({'query_text': query}, unknown_col)
+
+
+def test_responses_invalid(client):
+    response = client.post('/v2/responses',
+                           data=json.dumps({'queries': 'not a list'}),
+                           content_type='application/json')
+    assert response.status_code == 400
+
+
+def test_explain(client):
+    query = 'some test response'
+    try:
+        response = client.get('/v2/explain/{}/'.format(query))
+        assert response.status_code == 200
+
+        explanation = json.loads(response.data.decode())
+        assert explanation['query'] == query
+        assert 'explain' in explanation['stages_ms']
+        assert explanation['expansion']['tokens'] == query.split()
+
+        # The search model is only built with the latent semantic space for
+        # the lsa engine, so another engine answers instead, and is reported.
+        response = client.get('/v2/explain/{}/?engine=lsa'.format(query))
+        assert json.loads(response.data.decode())['engine'] in ('mongo',
+                                                                'bm25')
+
+        # Explaining a query gives the same response as asking it.
+        single = client.get('/v2/response/{}/?style=plain'.format(query))
+        assert json.loads(single.data.decode())['response'] == \
+            explanation['response']
+    finally:
+        # Unknown queries are written in the background, so they have to be
+        # written before they can be deleted.
+        UnknownQueryRecorder.get_instance().flush()
+        factory.delete_document({'query_text': query}, unknown_col)
+
+
+def test_metrics(client):
+    response = client.get('/v2/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert '# TYPE chatbot_stage_seconds histogram' in \
+        response.data.decode()
 
 
 def test_get_conflict_ids(client):
@@ -197,6 +269,22 @@ def test_get_unknown_queries(client):
         factory.delete_document(query, unknown_col)
 
 
+def test_get_most_frequent_unknown_queries(client):
+    queries = [{'query_text': 'test frequent unknown_query {}'.format(i),
+                'count': 1000000 + i}
+               for i in range(3)]
+    for query in queries:
+        factory.post_document(query.copy(), unknown_col)
+
+    try:
+        response = client.get('/v2/unknown_queries/?limit=2')
+        response_data = json.loads(response.data.decode())
+        assert response_data == queries[:0:-1]
+    finally:
+        for query in queries:
+            factory.delete_document(query, unknown_col)
+
+
 def test_delete_unknown_query(client):
     query = {'query_text': 'test unknown_query'}
     factory.post_document(query, unknown_col)
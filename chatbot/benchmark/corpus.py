@@ -0,0 +1,100 @@
+import json
+
+import numpy as np
+
+
+VOCABULARY_FILE = 'chatbot/nlp/statics/no_50k.json'
+
+BENCHMARK_URL = 'https://benchmark.chatbot.local/side/{}'
+
+
+class CorpusGenerator:
+    """ Generates synthetic pages in the format of the scraper output, with
+    Norwegian words drawn by their frequency in no_50k.json. The same seed
+    always gives the same corpus. """
+
+    def __init__(self, seed=0, vocabulary_file=VOCABULARY_FILE):
+        with open(vocabulary_file, 'r') as f:
+            frequencies = json.load(f)
+
+        self.random = np.random.RandomState(seed)
+        self.words = np.array(list(frequencies))
+        counts = np.array(list(frequencies.values()), dtype=np.float64)
+        # Words are drawn by searching the cumulative distribution, which is
+        # much faster than passing the probabilities to choice every time.
+        self.cumulative = np.cumsum(counts / counts.sum())
+
+    def __get_text(self, min_words, max_words):
+        n_words = self.random.randint(min_words, max_words + 1)
+        indexes = np.searchsorted(self.cumulative,
+                                  self.random.random_sample(n_words))
+        return ' '.join(self.words[np.minimum(indexes, len(self.words) - 1)])
+
+    def get_pages(self, n_paragraphs, paragraphs_per_page=10,
+                  paragraphs_per_section=3):
+        """
+        Generates pages until there are n_paragraphs paragraphs in total.
+        Each page has meta keywords and a number of titled sections, like
+        the pages found by the scraper.
+        :return: a list of pages which can be loaded by the Serializer.
+        """
+        pages = []
+        paragraph_id = 0
+
+        for page_number in range(0, n_paragraphs, paragraphs_per_page):
+            n_page = min(paragraphs_per_page, n_paragraphs - page_number)
+
+            children = [{'tag': 'meta',
+                         'text': ','.join(self.__get_text(3, 3).split()),
+                         'id': 'meta-{}'.format(page_number),
+                         'links': []}]
+
+            for section in range(0, n_page, paragraphs_per_section):
+                paragraphs = []
+                for _ in range(min(paragraphs_per_section, n_page - section)):
+                    paragraphs.append({'tag': 'p',
+                                       'text': self.__get_text(10, 60),
+                                       'id': 'p-{}'.format(paragraph_id),
+                                       'links': []})
+                    paragraph_id += 1
+
+                children.append({'tag': 'h3',
+                                 'text': self.__get_text(2, 6),
+                                 'id': 'h-{}-{}'.format(page_number, section),
+                                 'children': paragraphs})
+
+            pages.append({'url': BENCHMARK_URL.format(len(pages)),
+                          'tree': {'tag': 'root', 'text': 'root',
+                                   'id': 'root-{}'.format(page_number),
+                                   'children': children}})
+
+        return pages
+
+    def get_queries(self, pages, n_queries, min_words=2, max_words=4):
+        """ Generates distinct queries from consecutive words of random
+        paragraphs in the pages, so that every query matches some content.
+        Queries are distinct, so that none of them is answered from the
+        response cache. """
+        paragraphs = [paragraph['text'].split()
+                      for page in pages
+                      for section in page['tree']['children'][1:]
+                      for paragraph in section['children']]
+
+        queries = []
+        seen = set()
+        # Give up if the corpus is too small to have enough distinct queries.
+        for _ in range(n_queries * 10):
+            if len(queries) == n_queries:
+                break
+
+            words = paragraphs[self.random.randint(len(paragraphs))]
+            n_words = min(len(words),
+                          self.random.randint(min_words, max_words + 1))
+            start = self.random.randint(len(words) - n_words + 1)
+            query = ' '.join(words[start:start + n_words])
+
+            if query not in seen:
+                seen.add(query)
+                queries.append(query)
+
+        return queries
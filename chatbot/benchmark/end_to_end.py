@@ -0,0 +1,157 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from chatbot.benchmark.corpus import CorpusGenerator
+from chatbot.launch import insert_documents
+from chatbot.model.serializer import Serializer
+from chatbot.nlp.query import QueryHandler
+from chatbot.util.latency import get_latencies
+from chatbot.util.metrics import Metrics
+
+
+DEFAULT_OUTPUT = 'logs/benchmark_end_to_end.json'
+
+
+def get_commit():
+    """ Returns the git commit of the code being benchmarked, if known. """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       stderr=subprocess.DEVNULL) \
+                         .decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_corpus(pages):
+    """
+    Loads the pages the same way as launch.py: through the Serializer and
+    insert_documents, which also builds the search model.
+    :return: the number of documents and the seconds spent in each step.
+    """
+    # The Serializer only reads scraper output from files.
+    with tempfile.NamedTemporaryFile('w', suffix='.json',
+                                     delete=False) as f:
+        json.dump(pages, f)
+
+    try:
+        start = time.perf_counter()
+        ser = Serializer(f.name)
+        ser.serialize_data()
+        data = ser.get_models()
+        serialize_seconds = time.perf_counter() - start
+    finally:
+        os.remove(f.name)
+
+    start = time.perf_counter()
+    insert_documents(data)
+    insert_seconds = time.perf_counter() - start
+
+    return len(data), {'serialize': serialize_seconds,
+                       'insert': insert_seconds}
+
+
+def run_queries(queries, source='benchmark', threads=1):
+    """
+    Answers every query with QueryHandler.get_response, from the given
+    number of threads at once.
+    :return: the latency of each query in milliseconds, the total number of
+    seconds and the mean milliseconds spent in each stage.
+    """
+    handler = QueryHandler()
+
+    # Warm up, so that loading the models is not part of the timings.
+    handler.get_response('benchmark', 'plain', source)
+
+    metrics = Metrics.get_instance()
+    before = {stage: (histogram.sum, histogram.count)
+              for stage, histogram in metrics.stages.items()}
+
+    def answer(query):
+        start = time.perf_counter()
+        handler.get_response(query, 'plain', source)
+        return (time.perf_counter() - start) * 1000
+
+    total = time.perf_counter()
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            latencies = list(executor.map(answer, queries))
+    else:
+        latencies = [answer(query) for query in queries]
+    total = time.perf_counter() - total
+
+    stages = {}
+    for stage, histogram in metrics.stages.items():
+        seconds, count = before.get(stage, (0.0, 0))
+        if histogram.count > count:
+            stages[stage] = (histogram.sum - seconds) * 1000 / len(queries)
+
+    return latencies, total, stages
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Loads a synthetic corpus into the development database '
+                    'and measures the latency of answering queries.')
+    parser.add_argument('--paragraphs', type=int, default=1000,
+                        help='Paragraphs in the corpus, 1k to 500k')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--threads', type=int, default=1,
+                        help='Queries answered at the same time')
+    parser.add_argument('--skip-load', action='store_true',
+                        help='Query the corpus already in the database')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    # Loading the corpus replaces the content of the database.
+    if str(os.getenv('DEBUG')) != 'TRUE':
+        parser.error('Set DEBUG=TRUE to use the development database')
+
+    generator = CorpusGenerator(args.seed)
+    pages = generator.get_pages(args.paragraphs)
+    queries = generator.get_queries(pages, args.queries)
+
+    results = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'corpus': {'paragraphs': args.paragraphs, 'pages': len(pages),
+                   'seed': args.seed}
+    }
+
+    if not args.skip_load:
+        print('Loading {} paragraphs'.format(args.paragraphs))
+        documents, load_seconds = load_corpus(pages)
+        results['corpus']['documents'] = documents
+        results['load_seconds'] = load_seconds
+
+    print('Answering {} queries'.format(len(queries)))
+    latencies, seconds, stages = run_queries(queries, threads=args.threads)
+    results['queries'] = len(queries)
+    results['threads'] = args.threads
+    results['throughput'] = len(queries) / seconds
+    results['latency_ms'] = get_latencies(latencies)
+    results['stages_ms'] = stages
+
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print('{:.1f} queries/s, p50 {:.2f} ms, p95 {:.2f} ms, p99 {:.2f} ms'
+          .format(results['throughput'], results['latency_ms']['p50'],
+                  results['latency_ms']['p95'],
+                  results['latency_ms']['p99']))
+    print('Results written to {}'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+import argparse
+import copy
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+
+
+BASELINE_FILE = 'chatbot/benchmark/nlp_baseline.json'
+
+# Slowdowns beyond this fraction of the baseline are regressions.
+TOLERANCE = 0.25
+
+# Cold runs are repeated in this many fresh processes.
+COLD_RUNS = 3
+
+# The fixed inputs of the benchmarks.
+TEXT = ('Du kan søke om barnehageplass for barn som er født før september. '
+        'Søknadsfristen for hovedopptaket er 1. mars, og du får svar på '
+        'søknaden i løpet av april. Foreldrebetalingen er lik for alle '
+        'kommunale og private barnehager.')
+
+QUERIES = ['når er søknadsfristen for barnehage',
+           'hvordan søker jeg om byggetillatelse',
+           'hva koster eiendomsskatt',
+           'åpningstider legevakten']
+
+WORDS = [('barnehager', 'NOUN'), ('søker', 'VERB'), ('kommunale', 'ADJ'),
+         ('byggetillatelsen', 'NOUN'), ('betalte', 'VERB'),
+         ('private', 'ADJ')]
+
+CONTENT = {
+    'title': 'Søke barnehageplass',
+    'texts': [TEXT],
+    'keywords': [{'keyword': 'barnehager', 'confidence': 0.5},
+                 {'keyword': 'søknadsfristen', 'confidence': 0.3},
+                 {'keyword': 'foreldrebetalingen', 'confidence': 0.2}]
+}
+
+TOKENS = ['barnehage', 'skole', 'lege', 'skatt', 'søknad', 'bil']
+
+
+# Every benchmark imports what it needs in its setup, so that a cold run in a
+# fresh process includes loading the models it depends on. The setups return
+# the function to time.
+
+def _setup_tokenize():
+    from chatbot.nlp.keyword import tokenize
+    return lambda: tokenize(TEXT)
+
+
+def _setup_lemmatize():
+    from chatbot.nlp.keyword import lemmatize
+    return lambda: [lemmatize(word, pos) for word, pos in WORDS]
+
+
+def _setup_expand_query():
+    from chatbot.nlp.query import expand_query
+    return lambda: [expand_query(query) for query in QUERIES]
+
+
+def _setup_lemmatize_content_keywords():
+    from chatbot.nlp.keyword import lemmatize_content_keywords
+    # The keywords are lemmatized in place, so every call needs a copy.
+    return lambda: lemmatize_content_keywords(copy.deepcopy(CONTENT))
+
+
+def _setup_get_keywords():
+    from chatbot.nlp.keyword import get_keywords, get_tfidf_model
+    vectorizer, _, feature_names = get_tfidf_model([TEXT] + QUERIES)
+    return lambda: get_keywords(vectorizer, feature_names, TEXT)
+
+
+def _setup_get_synset():
+    from chatbot.nlp.synset import SynsetWrapper
+    synsets = SynsetWrapper.get_instance()
+    return lambda: [synsets.get_synset(token) for token in TOKENS]
+
+
+BENCHMARKS = {
+    'tokenize': _setup_tokenize,
+    'lemmatize': _setup_lemmatize,
+    'expand_query': _setup_expand_query,
+    'lemmatize_content_keywords': _setup_lemmatize_content_keywords,
+    'get_keywords': _setup_get_keywords,
+    'get_synset': _setup_get_synset
+}
+
+
+def run_warm(name, repeat=5):
+    """ Times a benchmark in this process after a warm up call. Returns the
+    fastest time per call in microseconds. """
+    function = BENCHMARKS[name]()
+    function()
+
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number * 1e6
+
+
+def run_cold_child(name):
+    """ Times the setup and the first call of a benchmark, in milliseconds.
+    Only meaningful in a fresh process. """
+    start = time.perf_counter()
+    function = BENCHMARKS[name]()
+    setup = time.perf_counter()
+    function()
+    end = time.perf_counter()
+
+    return {'setup_ms': (setup - start) * 1000,
+            'first_call_ms': (end - setup) * 1000}
+
+
+def run_cold(name, runs=COLD_RUNS):
+    """ Runs a benchmark in fresh processes. Returns the median time of the
+    setup and the first call in milliseconds. """
+    times = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-m',
+                                          'chatbot.benchmark.nlp',
+                                          '--child', name])
+        # Only the last line is the result, loading the models might print.
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        times.append(result['setup_ms'] + result['first_call_ms'])
+
+    return statistics.median(times)
+
+
+def get_machine():
+    """ Describes the machine, as timings are only comparable on the same
+    machine. The host name is left out, as it differs between containers
+    started from the same image. """
+    return {'python': platform.python_version(),
+            'machine': platform.machine(),
+            'processor': platform.processor()}
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Compares results against a baseline, both dicts from benchmark names to
+    {'warm_us': ..., 'cold_ms': ...}.
+    :return: a list of (name, variant, baseline, current, ratio) for every
+    time which is slower than the baseline by more than the tolerance.
+    """
+    regressions = []
+    for name, variants in results.items():
+        for variant, current in variants.items():
+            previous = baseline.get(name, {}).get(variant)
+            if not previous:
+                continue
+
+            ratio = current / previous
+            if ratio > 1 + tolerance:
+                regressions.append((name, variant, previous, current, ratio))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Micro-benchmarks of the NLP functions on fixed inputs.')
+    parser.add_argument('names', nargs='*',
+                        help='Benchmarks to run, all by default: {}'
+                             .format(', '.join(BENCHMARKS)))
+    parser.add_argument('--cold', action='store_true',
+                        help='Also time the first call in fresh processes')
+    parser.add_argument('--compare', action='store_true',
+                        help='Fail if slower than the baseline, or store '
+                             'the results if there is none yet')
+    parser.add_argument('--save', action='store_true',
+                        help='Store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_cold_child(args.child)))
+        return
+
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error('Unknown benchmarks: {}'.format(', '.join(unknown)))
+
+    results = {}
+    for name in args.names or BENCHMARKS:
+        results[name] = {'warm_us': run_warm(name)}
+        if args.cold:
+            results[name]['cold_ms'] = run_cold(name)
+
+        print('{:<28}{:>14.1f} us{}'.format(
+            name, results[name]['warm_us'],
+            '{:>14.1f} ms cold'.format(results[name]['cold_ms'])
+            if args.cold else ''))
+
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+
+    if args.compare and not baseline.get('results'):
+        # The first run records the baseline later runs are compared
+        # against.
+        print('No baseline stored yet, storing the results as the baseline')
+        args.save = True
+    elif args.compare:
+        if baseline.get('machine') != get_machine():
+            print('Warning: the baseline was stored on another machine')
+
+        regressions = compare(results, baseline.get('results', {}),
+                              args.tolerance)
+        for name, variant, previous, current, ratio in regressions:
+            print('Regression: {} {} {:.1f} -> {:.1f} ({:.0%} slower)'
+                  .format(name, variant, previous, current, ratio - 1))
+
+        if regressions:
+            sys.exit(1)
+        print('No regressions beyond {:.0%}'.format(args.tolerance))
+
+    if args.save:
+        # Keep the baselines of the benchmarks which were not run.
+        baseline['machine'] = get_machine()
+        baseline.setdefault('results', {}).update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print('Baseline written to {}'.format(args.baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+from chatbot.benchmark.corpus import CorpusGenerator
+
+
+def test_get_pages():
+    pages = CorpusGenerator(seed=1).get_pages(25, paragraphs_per_page=10)
+    assert len(pages) == 3
+
+    paragraphs = [paragraph for page in pages
+                  for section in page['tree']['children'][1:]
+                  for paragraph in section['children']]
+    assert len(paragraphs) == 25
+    assert len({paragraph['id'] for paragraph in paragraphs}) == 25
+
+    # Every page starts with meta keywords, like the scraped pages.
+    assert all(page['tree']['children'][0]['tag'] == 'meta' for page in pages)
+
+    # The same seed gives the same corpus.
+    assert CorpusGenerator(seed=1).get_pages(25) == pages
+
+
+def test_get_queries():
+    generator = CorpusGenerator(seed=1)
+    pages = generator.get_pages(100)
+    queries = generator.get_queries(pages, 20)
+
+    assert len(queries) == 20
+    assert len(set(queries)) == 20
+
+    texts = [paragraph['text'] for page in pages
+             for section in page['tree']['children'][1:]
+             for paragraph in section['children']]
+    assert all(any(query in text for text in texts) for query in queries)
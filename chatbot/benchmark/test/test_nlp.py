@@ -0,0 +1,16 @@
+from chatbot.benchmark.nlp import compare
+
+
+def test_compare():
+    baseline = {'tokenize': {'warm_us': 100.0, 'cold_ms': 1000.0},
+                'lemmatize': {'warm_us': 10.0}}
+    results = {'tokenize': {'warm_us': 120.0, 'cold_ms': 1500.0},
+               'lemmatize': {'warm_us': 20.0, 'cold_ms': 5.0},
+               'get_synset': {'warm_us': 1.0}}
+
+    regressions = compare(results, baseline, tolerance=0.25)
+
+    # Only times with a baseline are compared.
+    assert [(name, variant) for name, variant, *_ in regressions] == \
+        [('tokenize', 'cold_ms'), ('lemmatize', 'warm_us')]
+    assert regressions[1][4] == 2.0
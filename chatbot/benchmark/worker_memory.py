@@ -0,0 +1,117 @@
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+
+
+QUERIES = ['når er søknadsfristen for barnehage',
+           'hvordan søker jeg om byggetillatelse',
+           'hva koster eiendomsskat',
+           'åpningstider legevakten']
+
+
+def read_memory(pid):
+    """ Returns the resident (RSS), proportional (PSS) and unique (USS) set
+    size of a process in MiB. The unique set size is the memory which would
+    be freed if the process exited. """
+    fields = {}
+    with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+
+    return {'rss': fields['Rss'], 'pss': fields['Pss'],
+            'uss': fields['Private_Clean'] + fields['Private_Dirty']}
+
+
+def _work():
+    """ Expands a few queries in a worker, like a worker serving its first
+    requests. The models are loaded here unless they were preloaded. """
+    from chatbot.nlp.query import expand_queries
+    from chatbot.nlp.search_model import get_search_model
+
+    expand_queries(QUERIES)
+    get_search_model()
+    gc.collect()
+
+
+def run_workers(preload, workers):
+    """
+    Forks the workers the same way as uWSGI, from a master which has
+    loaded the models if preload is set. Every worker answers a few queries
+    before its memory is measured.
+    :return: the memory of the master and of each worker.
+    """
+    if preload:
+        # Importing the module loads the models and freezes them.
+        import chatbot.api.preload  # noqa: F401
+    else:
+        import chatbot.api.server  # noqa: F401
+
+    ready_read, ready_write = os.pipe()
+    exit_read, exit_write = os.pipe()
+
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(exit_write)
+            _work()
+            os.write(ready_write, b'1')
+            # Stay alive until the parent has measured every worker.
+            os.read(exit_read, 1)
+            os._exit(0)
+        pids.append(pid)
+
+    for _ in range(workers):
+        os.read(ready_read, 1)
+
+    memory = {'master': read_memory(os.getpid()),
+              'workers': [read_memory(pid) for pid in pids]}
+
+    os.close(exit_write)
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+    return memory
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measures the memory of forked workers, with and without '
+                    'preloading the models in the master.')
+    parser.add_argument('--workers', type=int, default=5)
+    parser.add_argument('--mode', choices=('lazy', 'preload'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_workers(args.mode == 'preload', args.workers)))
+        return
+
+    print('{:<10}{:>14}{:>14}{:>14}{:>16}'.format(
+        'Mode', 'Worker USS', 'Worker PSS', 'Master USS', 'Total PSS'))
+
+    # Each mode runs in a fresh process, so that nothing is loaded before.
+    for mode in ['lazy', 'preload']:
+        output = subprocess.check_output([sys.executable, '-m',
+                                          'chatbot.benchmark.worker_memory',
+                                          '--mode', mode,
+                                          '--workers', str(args.workers)])
+        memory = json.loads(output.decode().strip().splitlines()[-1])
+        workers = memory['workers']
+
+        print('{:<10}{:>11.1f} MiB{:>11.1f} MiB{:>11.1f} MiB{:>13.1f} MiB'
+              .format(mode,
+                      sum(worker['uss'] for worker in workers) / len(workers),
+                      sum(worker['pss'] for worker in workers) / len(workers),
+                      memory['master']['uss'],
+                      memory['master']['pss'] +
+                      sum(worker['pss'] for worker in workers)))
+
+
+if __name__ == '__main__':
+    main()
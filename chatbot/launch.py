@@ -6,6 +6,9 @@ from progressbar import ProgressBar
 
 from chatbot.model.serializer import Serializer
 from chatbot.model.model_factory import ModelFactory
+from chatbot.nlp.cache import invalidate_responses
+from chatbot.nlp.search_model import build_search_model
+from chatbot.nlp.unknown_queries import ensure_indexes
 from chatbot.util.config_util import Config
 
 
@@ -97,9 +100,15 @@ def insert_documents(data):
     factory.set_index(prod_col)
     factory.set_index(manual_col)
     factory.set_index(temp_col)
-    # Removes duplicates
-    factory.get_collection(unknown_col).create_index([("query_text", 1)],
-                                                     unique=True)
+    # Removes duplicates, and allows listing the most frequent queries
+    ensure_indexes(factory.get_collection(unknown_col))
+
+    # Build the search model used by the query system on the new documents
+    print("Building search model")
+    build_search_model(factory)
+
+    # Responses cached by the query system are based on the old documents
+    invalidate_responses()
 
     return conflicts
 
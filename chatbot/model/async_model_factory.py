@@ -0,0 +1,99 @@
+import asyncio
+import threading
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from chatbot.model.model_factory import CLIENT_OPTIONS, MAX_TIME_MS, \
+    PoolWaitListener, get_projection, get_url
+from chatbot.util.config_util import Config
+
+
+class AsyncModelFactory:
+    """ Reads documents with the asynchronous Motor driver, for the asyncio
+    server. Only the queries needed to answer users are supported, everything
+    else goes through ModelFactory. """
+    __instance = None
+    __lock = threading.Lock()
+
+    @staticmethod
+    def get_instance():
+        """ Static access method. """
+        if AsyncModelFactory.__instance is None:
+            with AsyncModelFactory.__lock:
+                if AsyncModelFactory.__instance is None:
+                    AsyncModelFactory()
+        return AsyncModelFactory.__instance
+
+    def __init__(self):
+        """ Virtually private constructor. """
+        if AsyncModelFactory.__instance is not None:
+            raise Exception("This class is a singleton!")
+        else:
+            self.__client = None
+            self.__db_name = None
+            AsyncModelFactory.__instance = self
+
+    def connect(self):
+        """ Creates the client of the working database. The client belongs to
+        the event loop running when it is created, so this must be called
+        from the event loop which uses it. """
+        ip, port = Config.get_db_connection()
+        username, password = Config.get_mongo_db_credentials()
+        db_name = Config.get_mongo_db()
+
+        self.close()
+        self.__client = AsyncIOMotorClient(
+            get_url(ip, db_name, username, password, port),
+            event_listeners=[PoolWaitListener()],
+            maxPoolSize=CLIENT_OPTIONS["max_pool_size"],
+            minPoolSize=CLIENT_OPTIONS["min_pool_size"],
+            waitQueueTimeoutMS=CLIENT_OPTIONS["wait_queue_timeout_ms"],
+            connectTimeoutMS=CLIENT_OPTIONS["connect_timeout_ms"],
+            socketTimeoutMS=CLIENT_OPTIONS["socket_timeout_ms"],
+            serverSelectionTimeoutMS=CLIENT_OPTIONS[
+                "server_selection_timeout_ms"])
+        self.__db_name = db_name
+
+    def close(self):
+        """ Closes the client, if connected. """
+        if self.__client is not None:
+            self.__client.close()
+            self.__client = None
+
+    def get_collection(self, collection):
+        return self.__client[self.__db_name][collection]
+
+    async def __text_search(self, collection, query, filters, number_of_docs,
+                            fields):
+        """ Returns the top scoring documents of a text search in a
+        collection, only including the given fields if any. """
+        cursor = self.get_collection(collection).find(
+            dict(filters, **{'$text': {'$search': query}}),
+            get_projection(fields, text_score=True))
+        cursor.sort([('score', {'$meta': 'textScore'})]).limit(number_of_docs)
+        cursor.max_time_ms(MAX_TIME_MS)
+
+        return await cursor.to_list(length=None)
+
+    async def get_document(self, query,
+                           prod_col=Config.get_mongo_collection("prod"),
+                           manual_col=Config.get_mongo_collection("manual"),
+                           number_of_docs=30, fields=None):
+        """ Searches for documents like ModelFactory.get_document, searching
+        both collections at the same time. """
+        # Manually changed documents are filtered away by the server.
+        docs, manual_docs = await asyncio.gather(
+            self.__text_search(prod_col, query,
+                               {'manually_changed': {'$ne': True}},
+                               number_of_docs, fields),
+            self.__text_search(manual_col, query, {}, number_of_docs, fields))
+
+        return docs + manual_docs
+
+    async def find_documents(self, query, collection, fields=None):
+        """ Returns every document in the collection matching the query, only
+        including the given fields if any. The query is aborted if it takes
+        too long. """
+        cursor = self.get_collection(collection).find(query,
+                                                      get_projection(fields))
+        return await cursor.max_time_ms(MAX_TIME_MS).to_list(length=None)
@@ -1,20 +1,111 @@
 import os
+import threading
+import time
 import pymongo
 
+from concurrent.futures import ThreadPoolExecutor
+
 from bson import json_util
+from pymongo import monitoring
 
 from chatbot.util.config_util import Config
+from chatbot.util.metrics import Metrics
+
+
+# Options of the MongoDB client, such as the size of its connection pool and
+# its timeouts.
+CLIENT_OPTIONS = Config.get_value(["mongo", "client"])
+
+# Queries answering a user are aborted by the server after this time.
+MAX_TIME_MS = Config.get_value(["mongo", "max_time_ms"])
+
+
+def get_url(ip, db_name, username, password, port):
+    """ Returns the url of a database. """
+    # Seperate url for mongodb in dopcker container
+    if os.getenv("DOCKER"):
+        return 'mongodb://mongodb:27017'
+
+    return "mongodb://{}:{}@{}:{}/{}".format(username, password, ip, port,
+                                             db_name)
+
+
+def get_projection(fields, text_score=False):
+    """ Returns a projection only including the given fields, or every field
+    if there are none, and the score of a text search if asked for. """
+    projection = {'score': {'$meta': 'textScore'}} if text_score else {}
+    if fields:
+        projection.update({field: 1 for field in fields}, _id=0)
+
+    return projection or None
+
+
+class PoolWaitListener(monitoring.ConnectionPoolListener):
+    """ Records how long each operation waits to check a connection out of
+    the pool, as the stage mongo_pool_wait. Long waits mean the pool is too
+    small for the number of threads using it. """
+
+    def __init__(self):
+        # The events of a checkout are published by the thread doing it.
+        self.local = threading.local()
+
+    def connection_check_out_started(self, event):
+        self.local.start = time.perf_counter()
+
+    def __observe(self):
+        start = getattr(self.local, 'start', None)
+        if start is not None:
+            Metrics.get_instance().observe('mongo_pool_wait',
+                                           time.perf_counter() - start)
+            self.local.start = None
+
+    def connection_checked_out(self, event):
+        self.__observe()
+
+    def connection_check_out_failed(self, event):
+        self.__observe()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
 
 
 class ModelFactory:
     __instance = None
-    __database = None
+    __lock = threading.Lock()
+    # Guards the client and the executor, which threads create on first use.
+    __client_lock = threading.Lock()
+    __url = None
+    __db_name = None
+    __client = None
+    __client_pid = None
+    __executor = None
+    __executor_pid = None
 
     @staticmethod
     def get_instance():
         """ Static access method. """
         if ModelFactory.__instance is None:
-            ModelFactory()
+            with ModelFactory.__lock:
+                if ModelFactory.__instance is None:
+                    ModelFactory()
         return ModelFactory.__instance
 
     def __init__(self):
@@ -25,16 +116,46 @@ class ModelFactory:
             ModelFactory.__instance = self
 
     def _set_database(self, ip, db_name, username, password, port):
-        """ Sets up conncetion to given database"""
+        """ Sets the database to use. The client connecting to it is created
+        on first use, so setting the same database again is free. """
+        url = get_url(ip, db_name, username, password, port)
 
-        # Seperate url for mongodb in dopcker container
-        if os.getenv("DOCKER"):
-            client = pymongo.MongoClient('mongodb://mongodb:27017')
-        else:
-            client = pymongo.MongoClient("mongodb://{}:{}@{}:{}/{}"
-                                         .format(username, password,
-                                                 ip, port, db_name))
-        self.database = client[db_name]
+        with self.__client_lock:
+            if url != self.__url:
+                if self.__client_pid == os.getpid():
+                    self.__client.close()
+                # Replaced by a client for the new url on first use.
+                self.__client_pid = None
+
+            self.__url = url
+            self.__db_name = db_name
+
+    def __get_client(self):
+        """ Returns the client of this process, with its connection pool. A
+        client must not be used after a fork, as its sockets and threads are
+        shared with or missing from the parent, so every process creates its
+        own. The client of the parent is left alone, as closing it would
+        close sockets the parent still uses. """
+        with self.__client_lock:
+            if self.__client_pid != os.getpid():
+                self.__client = pymongo.MongoClient(
+                    self.__url, connect=False,
+                    event_listeners=[PoolWaitListener()],
+                    maxPoolSize=CLIENT_OPTIONS["max_pool_size"],
+                    minPoolSize=CLIENT_OPTIONS["min_pool_size"],
+                    waitQueueTimeoutMS=CLIENT_OPTIONS[
+                        "wait_queue_timeout_ms"],
+                    connectTimeoutMS=CLIENT_OPTIONS["connect_timeout_ms"],
+                    socketTimeoutMS=CLIENT_OPTIONS["socket_timeout_ms"],
+                    serverSelectionTimeoutMS=CLIENT_OPTIONS[
+                        "server_selection_timeout_ms"])
+                self.__client_pid = os.getpid()
+            return self.__client
+
+    @property
+    def database(self):
+        """ The working database, using the client of this process. """
+        return self.__get_client()[self.__db_name]
 
     def set_db(self):
         """ Set the working database """
@@ -45,37 +166,76 @@ class ModelFactory:
 
         self._set_database(url, db, user, password, port)
 
+    def __get_executor(self):
+        """ Returns a thread pool for running queries concurrently. The pool
+        is created in each process, as its threads do not survive a fork. It
+        has a thread for each connection, as more threads would only wait for
+        a connection. """
+        with self.__client_lock:
+            if self.__executor_pid != os.getpid():
+                self.__executor = ThreadPoolExecutor(
+                    max_workers=CLIENT_OPTIONS["max_pool_size"])
+                self.__executor_pid = os.getpid()
+            return self.__executor
+
+    def __text_search(self, collection, query, filters, number_of_docs,
+                      fields):
+        """ Returns the top scoring documents of a text search in a
+        collection, only including the given fields if any. """
+        cursor = self.get_collection(collection).find(
+            dict(filters, **{'$text': {'$search': query}}),
+            get_projection(fields, text_score=True))
+        # Sort and retrieve some of the top scoring documents.
+        cursor.sort([('score', {'$meta': 'textScore'})]).limit(number_of_docs)
+        cursor.max_time_ms(MAX_TIME_MS)
+
+        return list(cursor)
+
     def get_document(self, query,
                      prod_col=Config.get_mongo_collection("prod"),
                      manual_col=Config.get_mongo_collection("manual"),
-                     number_of_docs=30):
+                     number_of_docs=30, fields=None):
         """
         Searches for documents using MongoDB in a given document collection.
-        Get 15 results from prod. Get 15 from Manual.
-        Go through every doc in prod and delete the ones with
-        manually_changed=true.  Then return every remaining document, remember
-        it's not sorted now, but for what we need it for this is not necessary.
+        Get 30 results from prod which have not been manually changed, and
+        30 results from manual. Both collections are searched at the same
+        time. Then return every document, remember it's not sorted now, but
+        for what we need it for this is not necessary.
+        Only the given fields are fetched, if any.
         """
-        prod_col = self.get_collection(prod_col)
-        cursor = prod_col.find({'$text': {'$search': query}},
-                               {'score': {'$meta': 'textScore'}})
-        # Sort and retrieve some of the top scoring documents.
-        cursor.sort([('score', {'$meta': 'textScore'})]).limit(number_of_docs)
+        return self.get_documents([query], prod_col, manual_col,
+                                  number_of_docs, fields)[0]
 
-        docs = []
-        for doc in cursor:
-            if doc["manually_changed"] is False:
-                docs.append(doc)
+    def get_documents(self, queries,
+                      prod_col=Config.get_mongo_collection("prod"),
+                      manual_col=Config.get_mongo_collection("manual"),
+                      number_of_docs=30, fields=None):
+        """
+        Searches for the documents of several queries like get_document. The
+        collections are searched for every query at the same time, so a batch
+        of queries takes about as long as its slowest query.
+        Returns a list of documents for each query, in the same order.
+        """
+        executor = self.__get_executor()
 
-        manual_col = self.get_collection(manual_col)
-        cursor = manual_col.find({'$text': {'$search': query}},
-                                 {'score': {'$meta': 'textScore'}})
-        # Sort and retrieve some of the top scoring documents.
-        cursor.sort([('score', {'$meta': 'textScore'})]).limit(number_of_docs)
-        for doc in cursor:
-            docs.append(doc)
+        # Manually changed documents are filtered away by the server.
+        searches = [(executor.submit(self.__text_search, prod_col, query,
+                                     {'manually_changed': {'$ne': True}},
+                                     number_of_docs, fields),
+                     executor.submit(self.__text_search, manual_col, query,
+                                     {}, number_of_docs, fields))
+                    for query in queries]
+
+        return [docs.result() + manual_docs.result()
+                for docs, manual_docs in searches]
 
-        return docs
+    def find_documents(self, query, collection, fields=None):
+        """ Returns every document in the collection matching the query, only
+        including the given fields if any. Used when answering users, so the
+        query is aborted if it takes too long. """
+        cursor = self.get_collection(collection).find(query,
+                                                      get_projection(fields))
+        return list(cursor.max_time_ms(MAX_TIME_MS))
 
     def post_document(self, data, collection):
         """ Posts JSON data to colletion in db """
@@ -1,4 +1,5 @@
 import json
+import os
 import pymongo
 
 from chatbot.model.model_factory import ModelFactory
@@ -50,6 +51,57 @@ def test_get_document():
         fact.get_database().drop_collection("test")
 
 
+def test_get_document_fields():
+    data = [{"id": "test_id_{}".format(i), "keywords": ["emne"],
+             "url": "https://ntnu.no",
+             "content": {"title": "emne", "text": "tekst {}".format(i)},
+             "manually_changed": i == 1}
+            for i in range(2)]
+
+    try:
+        for d in data:
+            fact.get_database().get_collection("test").insert_one(d)
+        fact.set_index("test")
+        fact.set_index("test_manual")
+
+        docs = fact.get_document("emne", prod_col="test",
+                                 manual_col="test_manual",
+                                 fields=["id", "content.text"])
+
+        # Manually changed documents are left out, and only the requested
+        # fields are returned.
+        assert [doc["id"] for doc in docs] == ["test_id_0"]
+        assert docs[0]["content"] == {"text": "tekst 0"}
+        assert "url" not in docs[0]
+    finally:
+        fact.get_database().drop_collection("test")
+        fact.get_database().drop_collection("test_manual")
+
+
+def test_get_documents():
+    data = [{"id": "test_id_{}".format(i), "keywords": [keyword],
+             "content": {"title": keyword, "text": "tekst"}}
+            for i, keyword in enumerate(["emne", "skole"])]
+
+    try:
+        for d in data:
+            fact.get_database().get_collection("test").insert_one(d)
+        fact.set_index("test")
+        fact.set_index("test_manual")
+
+        docs_list = fact.get_documents(["skole", "sakfscfdsojimad", "emne"],
+                                       prod_col="test",
+                                       manual_col="test_manual",
+                                       fields=["id"])
+
+        # The documents of every query are returned in the same order.
+        assert [[doc["id"] for doc in docs] for docs in docs_list] == \
+            [["test_id_1"], [], ["test_id_0"]]
+    finally:
+        fact.get_database().drop_collection("test")
+        fact.get_database().drop_collection("test_manual")
+
+
 def test_update_document():
     data = {"name": "testname", "manually_changed": False}
     try:
@@ -83,3 +135,21 @@ def test_delete_document():
 
     finally:
         fact.get_database().drop_collection('test')
+
+
+def test_client_per_process():
+    client = fact.get_database().client
+
+    # Setting the same database again reuses the client and its pool.
+    fact.set_db()
+    assert fact.get_database().client is client
+
+    # A forked process creates its own client.
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.write(write, b'1' if fact.get_database().client is client else b'0')
+        os._exit(0)
+
+    os.waitpid(pid, 0)
+    assert os.read(read, 1) == b'0'
@@ -0,0 +1,181 @@
+import asyncio
+import collections
+import logging
+import multiprocessing
+import os
+import threading
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from chatbot.model.async_model_factory import AsyncModelFactory
+from chatbot.nlp.cache import ResponseCache, get_content_version
+from chatbot.nlp.query import ANSWER_FIELDS, NOT_FOUND, RETRIEVAL_ENGINE, \
+    _get_response, _handle_not_found, load_models, rank_documents, \
+    rank_queries
+from chatbot.util.config_util import Config
+from chatbot.util.metrics import Metrics, timed, traced
+
+
+# Number of processes doing the CPU work of answering queries.
+PROCESSES = Config.get_value(['query_system', 'async', 'processes'])
+# Seconds a process waits for the others to load the models before giving up.
+STARTUP_TIMEOUT = Config.get_value(['query_system', 'async',
+                                    'startup_timeout'])
+
+
+def _init_process(barrier, timeout=STARTUP_TIMEOUT):
+    ''' Loads the models in a new process, and waits until every other
+    process has loaded them as well. Fails if they have not done so within
+    the timeout, e.g. as one of them is stuck, so that the startup fails
+    rather than hangs. '''
+    load_models()
+    try:
+        barrier.wait(timeout)
+    except threading.BrokenBarrierError:
+        raise RuntimeError('The other query processes did not load the '
+                           'models within {} seconds'.format(timeout))
+
+
+def _run_timed(function, *args):
+    ''' Runs a function in one of the processes. Returns its result and the
+    time spent in each stage, as the metrics of the processes themselves are
+    never exported. '''
+    with traced() as trace:
+        result = function(*args)
+    return result, list(trace.stages.items())
+
+
+class AsyncQueryHandler:
+    ''' Answers queries like QueryHandler from an event loop, so that a single
+    process can wait on many queries at once. Tagging and scoring the queries
+    is done by a pool of processes which have loaded the models, and the
+    documents are read from MongoDB with an asynchronous client.
+
+    The stages timed in the processes are added to the metrics of this
+    process. Tracing is not supported, as traces follow threads rather than
+    tasks. '''
+
+    def __init__(self, processes=PROCESSES, engine=RETRIEVAL_ENGINE,
+                 startup_timeout=STARTUP_TIMEOUT):
+        self.processes = processes
+        self.engine = engine
+        self.startup_timeout = startup_timeout
+        self.factory = AsyncModelFactory.get_instance()
+        self.executor = None
+
+    async def start(self):
+        ''' Connects to the database and starts the processes, returning once
+        every process has loaded the models. Raises a RuntimeError if any of
+        them crashes or does not load the models within the timeout. '''
+        self.factory.connect()
+
+        # The processes are spawned, as forking a process with running
+        # threads is unsafe.
+        context = multiprocessing.get_context('spawn')
+        barrier = context.Barrier(self.processes)
+        self.executor = ProcessPoolExecutor(
+            self.processes, mp_context=context, initializer=_init_process,
+            initargs=(barrier, self.startup_timeout))
+
+        # A process is started for each job submitted while the others are
+        # busy. No process finishes a job before all of them have loaded the
+        # models, so submitting one job per process starts all of them.
+        # The pool is broken if a process crashes or times out, failing
+        # every job.
+        try:
+            await asyncio.gather(*[self.__run(os.getpid)
+                                   for _ in range(self.processes)])
+        except BrokenProcessPool as e:
+            self.executor.shutdown()
+            self.executor = None
+            raise RuntimeError('The query processes failed to start, as one '
+                               'of them crashed or did not load the models '
+                               'within {} seconds'
+                               .format(self.startup_timeout)) from e
+        logging.info('Started {} query processes'.format(self.processes))
+
+    async def stop(self):
+        ''' Stops the processes and closes the database client. '''
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        self.factory.close()
+
+    async def __run(self, function, *args):
+        ''' Runs a function in one of the processes. '''
+        loop = asyncio.get_running_loop()
+        result, stages = await loop.run_in_executor(
+            self.executor, _run_timed, function, *args)
+
+        metrics = Metrics.get_instance()
+        for stage, seconds in stages:
+            metrics.observe(stage, seconds)
+        return result
+
+    async def get_response(self, query, url_style='plain', source='dev'):
+        ''' Returns the response to a query, like QueryHandler.get_response.
+        '''
+        logging.info('Source: {}'.format(source))
+        Metrics.get_instance().count_request(source)
+
+        with timed('request'):
+            cache = ResponseCache.get_instance()
+            key = ResponseCache.get_key(query, url_style)
+
+            version = get_content_version()
+            response = cache.get(key)
+            if response is None:
+                response = await self.__search(query, url_style)
+                cache.set(key, response, version)
+            elif response == NOT_FOUND:
+                # Still count unknown queries answered from the cache.
+                _handle_not_found(query)
+
+        logging.info('Response: {}'.format(response))
+        return response
+
+    async def __search(self, query_text, url_style):
+        ''' Finds the best matching documents for a query, and builds the
+        response from them. '''
+        with timed('query_process'):
+            queries, ranked_list = await self.__run(rank_queries,
+                                                    [query_text], self.engine)
+
+        if ranked_list is None:
+            # The candidates are retrieved by the text search, and scored
+            # against the query.
+            with timed('mongo'):
+                docs = await self.factory.get_document(queries[0],
+                                                       fields=ANSWER_FIELDS)
+            with timed('query_process'):
+                ranked = (await self.__run(rank_documents, queries,
+                                           [docs]))[0]
+            results = [(docs[i], score) for i, score in ranked]
+        else:
+            with timed('mongo'):
+                results = await self.__get_answers(ranked_list[0])
+
+        with timed('answer'):
+            return _get_response(query_text, results, url_style)
+
+    async def __get_answers(self, ranked):
+        ''' Fetches the documents ranked by the search model, with one query
+        per collection. Returns (document, score) tuples, leaving out the
+        documents which have been deleted since the model was built. '''
+        collection_ids = collections.defaultdict(list)
+        for doc_id, collection, score in ranked:
+            collection_ids[collection].append(doc_id)
+
+        found_list = await asyncio.gather(*[
+            self.factory.find_documents({'id': {'$in': ids}}, collection,
+                                        ANSWER_FIELDS)
+            for collection, ids in collection_ids.items()])
+
+        docs = {(collection, doc['id']): doc
+                for collection, found in zip(collection_ids, found_list)
+                for doc in found}
+
+        return [(docs[(collection, doc_id)], score)
+                for doc_id, collection, score in ranked
+                if (collection, doc_id) in docs]
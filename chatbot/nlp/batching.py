@@ -0,0 +1,114 @@
+import collections
+import threading
+import time
+
+from chatbot.util.metrics import Metrics
+
+
+class _Request():
+    ''' An item waiting to be processed, and its result once it is. '''
+
+    def __init__(self, item):
+        self.item = item
+        self.arrival = time.monotonic()
+        self.done = False
+        self.result = None
+        self.error = None
+
+
+class BatchScheduler():
+    ''' Coalesces items submitted by concurrent threads, so that they are
+    processed together by a function taking a list of items and returning a
+    list of results in the same order.
+
+    There is no thread of its own. A thread submitting an item when nothing
+    is being processed processes its item straight away, so a single request
+    never waits. Items submitted meanwhile are queued, and the next of their
+    threads collects them into a batch once the current batch is done,
+    waiting until the oldest item has waited for the window or the batch is
+    full. Every other thread waits for its result. '''
+
+    def __init__(self, function, max_size, window):
+        self.function = function
+        self.max_size = max_size
+        self.window = window
+        self.pending = collections.deque()
+        self.running = False
+        self.condition = threading.Condition()
+
+    def submit(self, item):
+        ''' Processes an item in a batch, returning its result or raising its
+        error. '''
+        request = _Request(item)
+
+        with self.condition:
+            self.pending.append(request)
+            # Lets a thread collecting a batch know that it grew.
+            self.condition.notify_all()
+
+            # Only a thread which had to wait collects a batch over the
+            # window, as other requests are only likely to be arriving then.
+            busy = self.running
+            while self.running and not request.done:
+                self.condition.wait()
+            if not request.done:
+                self.running = True
+
+        if not request.done:
+            try:
+                self.__lead(request, busy)
+            finally:
+                with self.condition:
+                    self.running = False
+                    self.condition.notify_all()
+
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def __lead(self, request, busy):
+        ''' Processes batches until the given request is done. '''
+        while not request.done:
+            with self.condition:
+                if busy:
+                    deadline = self.pending[0].arrival + self.window
+                    while len(self.pending) < self.max_size and \
+                            time.monotonic() < deadline:
+                        self.condition.wait(deadline - time.monotonic())
+
+                size = min(len(self.pending), self.max_size)
+                batch = [self.pending.popleft() for _ in range(size)]
+
+            start = time.monotonic()
+            metrics = Metrics.get_instance()
+            for waiting in batch:
+                metrics.observe('batch_wait', start - waiting.arrival)
+
+            try:
+                self.__process(batch)
+            finally:
+                with self.condition:
+                    for done in batch:
+                        done.done = True
+                    self.condition.notify_all()
+
+            # Requests queued while this batch was processed are collected
+            # over the window as well.
+            busy = True
+
+    def __process(self, batch):
+        ''' Processes a batch, storing the result or the error of each
+        request. Should the batch fail, each item is processed on its own, so
+        that a bad item only fails its own request. '''
+        try:
+            results = self.function([request.item for request in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0].error = e
+                return
+            for request in batch:
+                self.__process([request])
+            return
+
+        for request, result in zip(batch, results):
+            request.result = result
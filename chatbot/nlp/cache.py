@@ -0,0 +1,172 @@
+import collections
+import os
+import threading
+import time
+
+from chatbot.nlp.shared_cache import get_shared_cache
+from chatbot.util.config_util import Config
+
+
+CACHE_SIZE = Config.get_value(['query_system', 'response_cache', 'max_size'])
+CACHE_TTL = Config.get_value(['query_system', 'response_cache', 'ttl'])
+CACHE_STAMP_FILE = Config.get_value(['query_system', 'response_cache',
+                                     'stamp_file'])
+
+
+def normalize_query(query):
+    ''' Normalizes a query text, so that queries only differing in case or
+    whitespace share a cache entry. '''
+    return ' '.join(query.split()).lower()
+
+
+def get_content_version(path=CACHE_STAMP_FILE):
+    ''' Returns the current version of the content, which changes every time
+    invalidate_responses is called by any process. '''
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def invalidate_responses(path=CACHE_STAMP_FILE):
+    ''' Invalidates the cached responses in every process, by updating the
+    modification time of the stamp file. Must be called whenever the content
+    the responses are based on changes. '''
+    touch_stamp(path)
+
+
+def touch_stamp(path):
+    ''' Updates the modification time of a stamp file, which other processes
+    compare with the time they last saw to find out that something changed.
+    '''
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # Make sure the version changes, even on file systems with a coarse
+    # timestamp resolution.
+    version = max(time.time_ns(), get_content_version(path) + 1000)
+
+    with open(path, 'a'):
+        os.utime(path, ns=(version, version))
+
+
+class ResponseCache():
+    ''' A bounded LRU cache of responses to queries, where each entry expires
+    after a fixed time to live. All entries are dropped when the content
+    version changes.
+
+    Misses in this process fall through to a cache shared by all processes
+    on the host, if one is configured, so that a popular query is computed
+    once per host rather than once per worker. '''
+    __instance = None
+    __lock = threading.Lock()
+
+    @staticmethod
+    def get_instance():
+        ''' Static access method '''
+        if ResponseCache.__instance is None:
+            with ResponseCache.__lock:
+                if ResponseCache.__instance is None:
+                    ResponseCache()
+        return ResponseCache.__instance
+
+    def __init__(self):
+        ''' Virtually private constructor '''
+        if ResponseCache.__instance is not None:
+            raise Exception('This class is a singleton!')
+        else:
+            self.max_size = CACHE_SIZE
+            self.ttl = CACHE_TTL
+            self.entries = collections.OrderedDict()
+            self.version = get_content_version()
+            self.shared = get_shared_cache()
+            self.hits = 0
+            self.shared_hits = 0
+            self.misses = 0
+            # Guards the entries and counters, which are shared by every
+            # thread serving requests.
+            self.lock = threading.Lock()
+            ResponseCache.__instance = self
+
+    @staticmethod
+    def get_key(query, url_style):
+        ''' Returns the cache key for a query and url style. '''
+        return '{}:{}'.format(url_style, normalize_query(query))
+
+    def __check_version(self):
+        ''' Drops all entries if the content has changed. '''
+        version = get_content_version()
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    def get(self, key):
+        ''' Returns the cached response for the key, or None. '''
+        with self.lock:
+            self.__check_version()
+
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                # The entry has expired.
+                del self.entries[key]
+                entry = None
+
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            version = self.version
+
+        # The shared cache is read without holding the lock, so that other
+        # threads are not kept waiting on it.
+        response = self.shared.get(key, version) if self.shared else None
+
+        with self.lock:
+            if response is None:
+                self.misses += 1
+                return None
+
+            self.shared_hits += 1
+            self.hits += 1
+            if version == self.version:
+                self.entries[key] = (response, time.monotonic() + self.ttl)
+                self.entries.move_to_end(key)
+            return response
+
+    def set(self, key, response, version):
+        ''' Stores a response, evicting the least recently used entries if
+        the cache is full. The version is the content version read before
+        the response was looked up and computed. Responses are not stored if
+        the content has changed since, as they might be based on the old
+        content. '''
+        with self.lock:
+            # Another thread may already have moved to the new version, so
+            # the version of this response is compared rather than the one
+            # of the cache.
+            self.__check_version()
+            if version != self.version:
+                return
+
+            self.entries[key] = (response, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+        if self.shared:
+            self.shared.set(key, response, version, self.ttl)
+
+    def clear(self):
+        ''' Drops all entries in this process. Entries in the shared cache are
+        dropped by invalidate_responses. '''
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        ''' Returns the number of hits, misses and entries. Hits include the
+        ones served by the shared cache. '''
+        with self.lock:
+            return {'hits': self.hits, 'shared_hits': self.shared_hits,
+                    'misses': self.misses, 'size': len(self.entries)}
@@ -1,23 +1,76 @@
 import collections
 import string
 import re
+import threading
 
-import spacy
-from spacy.lemmatizer import Lemmatizer
-from spacy.lang.nb import LEMMA_INDEX, LEMMA_EXC, LEMMA_RULES
+from chatbot.util.config_util import Config
 
-from sklearn.feature_extraction.text import TfidfVectorizer
 
-import nltk
+# Name of, or path to, the Norwegian language model for Spacy.
+SPACY_MODEL = Config.get_value(['nlp', 'spacy_model'])
 
 
-# Load a Norwegian language model for Spacy.
-nb = spacy.load('nb_dep_ud_sm')
+class LazyModel():
+    ''' A Spacy model which is loaded the first time it is used, rather than
+    when the module is imported. Otherwise behaves like the loaded model.
+    The pipeline is not thread safe, so only one thread runs it at a time. '''
 
-lemmatize = Lemmatizer(LEMMA_INDEX, LEMMA_EXC, LEMMA_RULES)
+    def __init__(self, name):
+        self.name = name
+        self.__model = None
+        self.__lock = threading.RLock()
+
+    def load(self):
+        ''' Loads the model, if not already loaded, and returns it. '''
+        if self.__model is None:
+            with self.__lock:
+                if self.__model is None:
+                    # Importing Spacy takes a while as well.
+                    import spacy
+                    self.__model = spacy.load(self.name)
+        return self.__model
+
+    def is_loaded(self):
+        return self.__model is not None
+
+    def __call__(self, *args, **kwargs):
+        model = self.load()
+        with self.__lock:
+            return model(*args, **kwargs)
+
+    def pipe(self, texts, **kwargs):
+        ''' Processes several texts at once. The documents are returned as a
+        list, as a generator would run the pipeline outside of the lock. '''
+        model = self.load()
+        with self.__lock:
+            return list(model.pipe(texts, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+
+# The Norwegian language model for Spacy.
+nb = LazyModel(SPACY_MODEL)
+
+# The lemmatizer, loaded by lemmatize on first use.
+_lemmatizer = None
+_lemmatizer_lock = threading.Lock()
+
+
+def lemmatize(word, pos):
+    ''' Returns the possible lemmas of a word with a given POS tag. The lookup
+    tables are large, so they are only loaded when first needed. '''
+    global _lemmatizer
+    if _lemmatizer is None:
+        with _lemmatizer_lock:
+            if _lemmatizer is None:
+                from spacy.lemmatizer import Lemmatizer
+                from spacy.lang.nb import LEMMA_INDEX, LEMMA_EXC, LEMMA_RULES
+
+                _lemmatizer = Lemmatizer(LEMMA_INDEX, LEMMA_EXC, LEMMA_RULES)
+
+    return _lemmatizer(word, pos)
 
-nltk.download('wordnet', quiet=True)
-nltk.download('omw', quiet=True)
 
 START_SPEC_CHARS = re.compile('^[{}]+'.format(re.escape(string.punctuation)))
 END_SPEC_CHARS = re.compile('[{}]+$'.format(re.escape(string.punctuation)))
@@ -106,6 +159,9 @@ def lemmatize_content_keywords(content):
 def get_tfidf_model(corpus):
     ''' Create a simple generic model which can be used both for search
     using cosine similarity as well as keyword generation. '''
+    # Scikit-learn is slow to import, and only needed to build a model.
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
     # Create a vectorizer which will turn documents into vectors.
     # We use a custom list of stopwords and a custom tokenizer.
     vectorizer = TfidfVectorizer(tokenizer=tokenize, sublinear_tf=True)
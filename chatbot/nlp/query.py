@@ -1,18 +1,23 @@
+import collections
 import string
 import os
-import pymongo
 import logging
 
-from sklearn.metrics.pairwise import cosine_similarity
-
-from spellchecker import SpellChecker
-
-from nltk.corpus import wordnet as wn
+import numpy as np
 
 from chatbot.model.model_factory import ModelFactory
+from chatbot.nlp.batching import BatchScheduler
+from chatbot.nlp.cache import ResponseCache, get_content_version
 from chatbot.nlp.keyword import get_tfidf_model, get_stopwords, lemmatize, nb
+from chatbot.nlp.search_model import get_corpus_text, get_search_model
+from chatbot.nlp.spelling import SpellingCorrector
 from chatbot.nlp.synset import SynsetWrapper
+from chatbot.nlp.unknown_queries import UnknownQueryRecorder
+from chatbot.nlp.wordnet_table import WordNetTable
 from chatbot.util.config_util import Config
+from chatbot.util.metrics import Metrics, annotate, annotate_detail, \
+    get_trace, is_detailed, split_trace, timed, traced
+from chatbot.util.slow_query_log import is_sampled, log_if_slow
 from chatbot.util.logger_util import set_logger
 
 
@@ -30,6 +35,19 @@ ANSWER_THRESHOLD = Config.get_value(['query_system', 'answer_threshold'])
 SIMILARITY_THRESHOLD = Config.get_value(['query_system',
                                          'similarity_threshold'])
 
+# Where candidate documents are retrieved from: 'mongo' for the text search
+# in MongoDB, 'bm25' for the inverted index of the search model or 'lsa' for
+# the latent semantic space of the search model.
+RETRIEVAL_ENGINE = Config.get_value(['query_system', 'retrieval', 'engine'])
+
+# Queries answered by concurrent threads are searched together, in batches
+# collected over a short window.
+BATCHING = Config.get_value(['query_system', 'batching'])
+
+# The fields of a document needed to score it and to answer with it.
+ANSWER_FIELDS = ['id', 'url', 'content.title', 'content.text',
+                 'content.links']
+
 
 factory = ModelFactory.get_instance()
 factory.set_db()
@@ -37,32 +55,22 @@ factory.set_db()
 
 def _handle_not_found(query_text):
     '''
-    Inserts this specific query text into the unknown queries collection as
-    well as returning a fallback string.
+    Records this specific query text in the unknown queries collection as
+    well as returning a fallback string. The query is written in the
+    background, so this does not wait for the database. Queries which are
+    only explained are not recorded, as nobody actually asked them.
     '''
-    try:
-        unknown_col = Config.get_mongo_collection("unknown")
-        factory.get_database().get_collection(unknown_col).insert_one(
-            {"query_text": query_text})
-    except pymongo.errors.DuplicateKeyError:
-        # If we already have this specific query in the unknown_queries
-        # collection we don't need to add it again.
-        pass
+    if not is_detailed():
+        UnknownQueryRecorder.get_instance().record(query_text)
 
     return NOT_FOUND
 
 
-def _get_corpus_text(doc):
-    ''' Converts a document from the model into a string which will be used in
-    a corpus. '''
-    content = doc['content']['text']
-    return doc['content']['title'] + ' ' + content
-
-
 def _get_answer(doc):
     ''' Converts a document from the model into a (text, [links])-answer tuple
     '''
-    answer = [doc['content']['text'], doc['content']['links']
+    # The links are copied, so that the document itself is left unchanged.
+    answer = [doc['content']['text'], list(doc['content']['links'])
               if 'links' in doc['content'] else []]
     # Add the source-url to the list of urls, using the title as link text
     answer[1].append([doc['content']['title'], doc['url']])
@@ -92,12 +100,29 @@ def expand_query(query):
     ''' Attempts to expand the given query by using synonyms from WordNet. As
     a consequnece of this process, the query is also tokenized and lemmatized.
     '''
-    spell = SpellChecker(local_dictionary='chatbot/nlp/statics/no_50k.json')
+    with timed('tagging'):
+        doc = nb(query)
+
+    return _expand_doc(doc)
 
-    # Tokenize, tag and filter query using Spacy
+
+def expand_queries(queries):
+    ''' Expands a list of queries like expand_query, letting Spacy tokenize
+    and tag all of them in a single batch. '''
+    with timed('tagging'):
+        docs = list(nb.pipe(queries))
+
+    return [_expand_doc(doc) for doc in docs]
+
+
+def _expand_doc(doc):
+    ''' Expands a query which has been tokenized and tagged by Spacy. '''
+    spell = SpellingCorrector.get_instance()
+
+    # Filter the tagged query
     tokens = [
         # Store both token text and POS tag
-        (token.text, token.pos_) for token in nb(query)
+        (token.text, token.pos_) for token in doc
         # Filter away punctuation.
         if token.text not in string.punctuation
     ]
@@ -105,18 +130,22 @@ def expand_query(query):
     # Add possible spelling corrections, without duplicates
     # We also want to keep the original token, since the detected misspelling
     # migt be intentional - power to the user!
+    # Words already in the dictionary are returned unchanged by the spelling
+    # corrector, without looking up any candidates.
+    texts = [token[0] for token in tokens]
+    with timed('spelling'):
+        corrections = [(spell.correction(token[0]), token[1])
+                       for token in tokens]
     tokens += [
-        (spell.correction(token[0]), token[1]) for token in tokens
-        if not spell.correction(token[0]) in [
-            token[0] for token in tokens
-        ]
+        correction for correction in corrections if correction[0] not in texts
     ]
 
     # Lemmatize tokens
-    tokens = [
-      # Store tuples of lemmatized tokens and their corresponding POS tags.
-      (lemmatize(token[0], token[1])[0], token[0]) for token in tokens
-    ]
+    with timed('lemmatization'):
+        tokens = [
+          # Store tuples of lemmatized tokens and their corresponding POS tags.
+          (lemmatize(token[0], token[1])[0], token[0]) for token in tokens
+        ]
 
     # Filter away stopwords as we do not want to expand them.
     tokens = [token for token in tokens if token not in get_stopwords()]
@@ -127,30 +156,35 @@ def expand_query(query):
     # The tokens in the expanded query.
     result = []
 
-    for token in tokens:
-        # Convert POS tags from Spacy to WordNet.
-        pos = getattr(wn, token[1], None)
+    # Get the precompiled table of Norwegian WordNet synonyms.
+    wordnet = WordNetTable.get_instance()
 
-        # Find all synsets for the word, using the Norwegian language.
-        synsets = wn.synsets(token[0], lang='nob', pos=pos)
+    with timed('wordnet'):
+        # Find the synonyms in all synsets for each word, using the Norwegian
+        # language and converting POS tags from Spacy to WordNet. None if the
+        # word has no synsets.
+        wordnet_synonyms_list = [
+            wordnet.get_synonyms(token[0], wordnet.get_pos(token[1]))
+            for token in tokens
+        ]
 
-        # Get a custom synset wrapper.
-        custom_synsets = SynsetWrapper.get_instance()
+    # Get a custom synset wrapper.
+    custom_synsets = SynsetWrapper.get_instance()
 
-        # Get the synset for this token.
-        custom_synset = custom_synsets.get_synset(token[0])
+    with timed('synsets'):
+        # Get the synset for each token.
+        custom_synset_list = [custom_synsets.get_synset(token[0])
+                              for token in tokens]
 
+    for token, wordnet_synonyms, custom_synset in zip(tokens,
+                                                      wordnet_synonyms_list,
+                                                      custom_synset_list):
         if custom_synset:
-            # Remove the token itself to avoid duplication.
-            custom_synset.remove(token[0])
-            synonyms.update(custom_synset)
+            # Leave out the token itself to avoid duplication.
+            synonyms.update(custom_synset - {token[0]})
 
-        if synsets:
-            for synset in synsets:
-                # Find all lemmas in the synset.
-                for name in synset.lemma_names(lang='nob'):
-                    # Some lemmas contain underscores, which we remove.
-                    synonyms.add(name.replace('_', ' '))
+        if wordnet_synonyms is not None:
+            synonyms.update(wordnet_synonyms)
 
             # If we found synonyms, we only add the synonyms. This is because
             # the original word is already included in the synset, so this
@@ -163,57 +197,120 @@ def expand_query(query):
     # Add custom synset to the query
     result += synonyms
 
-    return ' '.join(result)
-
+    if is_detailed():
+        # Explain where each token of the expanded query came from.
+        annotate_detail('expansion', {
+            'tokens': texts,
+            'spelling': [correction[0] for correction in corrections
+                         if correction[0] not in texts],
+            'lemmas': [token[0] for token in tokens],
+            'wordnet': {token[0]: sorted(wordnet_synonyms)
+                        for token, wordnet_synonyms
+                        in zip(tokens, wordnet_synonyms_list)
+                        if wordnet_synonyms is not None},
+            'synsets': {token[0]: sorted(custom_synset - {token[0]})
+                        for token, custom_synset
+                        in zip(tokens, custom_synset_list)
+                        if custom_synset},
+            'expanded_query': ' '.join(result)
+        })
 
-def _perform_search(query_text, url_style):
-    ''' Takes a query string and finds the best matching document in the
-    database. '''
+    return ' '.join(result)
 
-    logging.info('Pre expansion: {}'.format(query_text))
 
-    # Perform simple query expansion on the original query.
-    query = expand_query(query_text)
+def _get_scores(model, queries, docs_list):
+    ''' Computes the cosine similarity between each expanded query and each
+    of the documents retrieved for it. Returns a list of scores per query, or
+    None for queries which could not be scored. '''
 
-    logging.info('Post expansion: {}'.format(query))
+    # Use the TF-IDF model built over the full document set when documents
+    # were inserted.
+    if model:
+        with timed('similarity'):
+            return model.score(queries, docs_list)
 
-    # Retrieve a set of documents using MongoDB. We then attempt to filter
-    # these further.
-    docs = factory.get_document(query)
+    # No model has been built yet, so create a TF-IDF model on the results
+    # from the MongoDB query instead.
+    result = []
+    for query, docs in zip(queries, docs_list):
+        try:
+            corpus = [get_corpus_text(doc) for doc in docs]
+            with timed('tfidf_fit'):
+                vectorizer, corpus_matrix, feature_names = \
+                    get_tfidf_model(corpus)
+        except ValueError:
+            # None of the documents contain any terms.
+            result.append(None)
+            continue
 
-    # Prevent generating an empty corpus if no documents were found.
-    if not docs:
+        # Both vectors are L2-normalized, so the dot product is the cosine
+        # similarity.
+        with timed('similarity'):
+            query_vector = vectorizer.transform([query])
+            result.append((corpus_matrix * query_vector.T).toarray()[:, 0])
+
+    return result
+
+
+def _rank(scores):
+    ''' Selects the candidates to answer with from their scores. Returns a
+    list of (position, score) tuples, best first, which is empty if no
+    candidate scored above the answer threshold. Candidates with the same
+    score are ordered by their position. '''
+    scores = np.asarray(scores, dtype=np.float64)
+
+    # This could be calculated using the mean of all scores and the
+    # standard deviation.
+    if not scores.size or scores.max() < ANSWER_THRESHOLD:
+        return []
+
+    # Allow returning multiple answers if they rank very similarly, using a
+    # tolerance for similarity between scores.
+    selected = np.flatnonzero(scores.max() - scores <= SIMILARITY_THRESHOLD)
+
+    # No more than MAX_ANSWERS are ever shown, but we need to know whether
+    # there were more than one answer.
+    limit = max(MAX_ANSWERS, 2)
+    if len(selected) > limit:
+        top = np.argpartition(-scores[selected], limit - 1)[:limit]
+        cutoff = scores[selected][top].min()
+        selected = selected[scores[selected] >= cutoff]
+
+    selected = selected[np.argsort(-scores[selected], kind='stable')][:limit]
+    return list(zip(selected.tolist(), scores[selected].tolist()))
+
+
+def _explain_candidates(ids, scores, ranked, text_scores=None):
+    ''' Describes the candidates of a query in a detailed trace: their
+    scores, which thresholds they passed and whether they were selected as
+    answers. Best candidates first. '''
+    if not is_detailed():
+        return
+
+    scores = np.zeros(len(ids)) if scores is None else np.asarray(scores)
+    top = scores.max() if scores.size else 0.0
+    answers = {i for i, score in ranked}
+
+    candidates = [{
+        'id': ids[i],
+        'text_score': text_scores[i] if text_scores is not None else None,
+        'score': float(scores[i]),
+        'answer_threshold': bool(scores[i] >= ANSWER_THRESHOLD),
+        'similarity_threshold': bool(top - scores[i] <= SIMILARITY_THRESHOLD),
+        'answer': i in answers
+    } for i in np.argsort(-scores, kind='stable').tolist()]
+
+    annotate_detail('scored_candidates', candidates)
+
+
+def _get_response(query_text, results, url_style):
+    ''' Builds the response to a query from a list of (doc, score) results
+    selected as answers, best first. '''
+    if not results:
         return _handle_not_found(query_text)
 
-    # Create a corpus on the results from the MongoDB query.
-    corpus = [_get_corpus_text(doc) for doc in docs]
-
-    # Create a TF-IDF model on the corpus.
-    vectorizer, corpus_matrix, feature_names = get_tfidf_model(corpus)
-
     try:
-        # Compare the search query with all documents in our new model using
-        # cosine similarity.
-        scores = cosine_similarity(vectorizer.transform([query]),
-                                   corpus_matrix)[0].tolist()
-
-        sorted_scores = sorted(scores, reverse=True)
-
-        # This could be calculated using the mean of all scores and the
-        # standard deviation.
-        if sorted_scores[0] < ANSWER_THRESHOLD:
-            return _handle_not_found(query_text)
-
-        # Allow returning multiple answers if they rank very similarly.
-        answers = []
-
-        for score in sorted_scores:
-            # Tolerance for similarity between scores.
-            if sorted_scores[0] - score > SIMILARITY_THRESHOLD:
-                break
-
-            # Add this result to the list of answers.
-            answers.append(_get_answer(docs[scores.index(score)]))
+        answers = [_get_answer(doc) for doc, score in results]
 
         if len(answers) == 1:
             # Return the answer straight away if there is only 1 result
@@ -237,13 +334,360 @@ def _perform_search(query_text, url_style):
         return '\n\n---\n\n'.join([MULTIPLE_ANSWERS] + answers)
     except KeyError:
         raise Exception('Document does not have content and texts.')
-    except ValueError:
-        return _handle_not_found(query_text)
+
+
+def _retrieve_mongo(model, queries):
+    ''' Retrieves candidates for the expanded queries by the text search in
+    MongoDB, and scores them. Returns a list of documents and a list of
+    scores, or None, for each query. '''
+
+    # Retrieve a set of documents for each query using MongoDB. We then
+    # attempt to filter these further. The queries of a batch are searched
+    # at the same time.
+    with timed('mongo'):
+        docs_list = factory.get_documents(queries, fields=ANSWER_FIELDS)
+
+    # Only score the queries which retrieved any documents.
+    found = [i for i, docs in enumerate(docs_list) if docs]
+    scores_list = [None] * len(queries)
+    if found:
+        scores = _get_scores(model, [queries[i] for i in found],
+                             [docs_list[i] for i in found])
+        for i, query_scores in zip(found, scores):
+            scores_list[i] = query_scores
+
+    return docs_list, scores_list
+
+
+def _search_mongo(model, query_texts, queries, url_style):
+    ''' Answers the expanded queries using candidates retrieved by the text
+    search in MongoDB. '''
+    docs_list, scores_list = _retrieve_mongo(model, queries)
+
+    with timed('ranking'):
+        ranked_list = [_rank(scores) if scores is not None else []
+                       for scores in scores_list]
+
+    annotate('candidates', [len(docs) for docs in docs_list])
+    annotate('answers', [[docs[i].get('id') for i, score in ranked]
+                         for docs, ranked in zip(docs_list, ranked_list)])
+    for docs, scores, ranked in zip(docs_list, scores_list, ranked_list):
+        _explain_candidates([doc.get('id') for doc in docs], scores, ranked,
+                            [doc.get('score') for doc in docs])
+
+    with timed('answer'):
+        return [_get_response(query_text,
+                              [(docs[i], score) for i, score in ranked],
+                              url_style)
+                for query_text, docs, ranked
+                in zip(query_texts, docs_list, ranked_list)]
+
+
+def _search_model(model, query_texts, queries, url_style, engine):
+    ''' Answers the expanded queries using candidates retrieved from the
+    search model by the given engine. MongoDB is only used to fetch the
+    documents which end up in the responses. '''
+    with timed(engine):
+        rows_list, scores_list = model.search(queries, engine)
+
+    with timed('ranking'):
+        ranked_list = [_rank(scores) for scores in scores_list]
+        ranked_rows = [[(rows[i], score) for i, score in ranked]
+                       for rows, ranked in zip(rows_list, ranked_list)]
+
+    annotate('candidates', [len(rows) for rows in rows_list])
+    annotate('answers', [[model.ids[row] for row, score in ranked]
+                         for ranked in ranked_rows])
+    for rows, scores, ranked in zip(rows_list, scores_list, ranked_list):
+        _explain_candidates([model.ids[row] for row in rows], scores, ranked)
+
+    # Fetch the answers to all the queries at once.
+    with timed('mongo'):
+        docs = model.get_documents(factory, [row for ranked in ranked_rows
+                                             for row, score in ranked],
+                                   ANSWER_FIELDS)
+
+    with timed('answer'):
+        return [_get_response(query_text,
+                              [(docs[row], score) for row, score in ranked
+                               if row in docs],
+                              url_style)
+                for query_text, ranked in zip(query_texts, ranked_rows)]
+
+
+def _get_engine(model, engine):
+    ''' Returns the engine which actually retrieves the candidates for the
+    given one. The other engines require a search model, so MongoDB is used
+    until one has been built, and the inverted index is used if the model has
+    no latent semantic space. '''
+    if engine not in ('bm25', 'lsa') or not model:
+        return 'mongo'
+    if engine == 'lsa' and model.svd is None:
+        return 'bm25'
+    return engine
+
+
+def get_candidates(query_texts, engine=RETRIEVAL_ENGINE):
+    ''' Returns the candidate documents for each query and their scores,
+    before any thresholds are applied, as (docs, scores) tuples. The scores
+    are None if the candidates could not be scored. Used to tune the
+    thresholds without repeating the searches. '''
+    queries = expand_queries(query_texts)
+    model = get_search_model()
+
+    engine = _get_engine(model, engine)
+    if engine == 'mongo':
+        return list(zip(*_retrieve_mongo(model, queries)))
+
+    rows_list, scores_list = model.search(queries, engine)
+    docs = model.get_documents(factory, [row for rows in rows_list
+                                         for row in rows], ANSWER_FIELDS)
+
+    # Leave out candidates which are no longer in the database.
+    candidates = []
+    for rows, scores in zip(rows_list, scores_list):
+        found = [i for i, row in enumerate(rows) if row in docs]
+        candidates.append(([docs[rows[i]] for i in found], scores[found]))
+    return candidates
+
+
+def load_models():
+    ''' Loads every model used to answer queries, which are otherwise loaded
+    on first use. '''
+    nb.load()
+    lemmatize('bolig', 'NOUN')
+    SpellingCorrector.get_instance()
+    WordNetTable.get_instance()
+    SynsetWrapper.get_instance()
+    get_search_model()
+
+
+def rank_queries(query_texts, engine=RETRIEVAL_ENGINE):
+    '''
+    Expands the queries and ranks the candidates of the search model, the
+    part of _perform_searches which does not need the database.
+    :return: the expanded queries, and for each query the (id, collection,
+    score) of the documents to answer with, best first. The answers are None
+    if the candidates are retrieved by the text search in MongoDB, which are
+    then ranked by rank_documents.
+    '''
+    queries = expand_queries(query_texts)
+    model = get_search_model()
+
+    engine = _get_engine(model, engine)
+    if engine == 'mongo':
+        return queries, None
+
+    with timed(engine):
+        rows_list, scores_list = model.search(queries, engine)
+
+    with timed('ranking'):
+        ranked_list = [[(model.ids[rows[i]], model.sources[rows[i]], score)
+                        for i, score in _rank(scores)]
+                       for rows, scores in zip(rows_list, scores_list)]
+
+    return queries, ranked_list
+
+
+def rank_documents(queries, docs_list):
+    ''' Scores and ranks the documents found by the text search in MongoDB
+    for each expanded query. Returns the (position, score) of the documents
+    to answer with, best first. '''
+    ranked_list = [[] for _ in queries]
+
+    # Only score the queries which retrieved any documents.
+    found = [i for i, docs in enumerate(docs_list) if docs]
+    if found:
+        scores = _get_scores(get_search_model(), [queries[i] for i in found],
+                             [docs_list[i] for i in found])
+        with timed('ranking'):
+            for i, query_scores in zip(found, scores):
+                if query_scores is not None:
+                    ranked_list[i] = _rank(query_scores)
+
+    return ranked_list
+
+
+def _perform_searches(query_texts, url_style, engine=RETRIEVAL_ENGINE):
+    ''' Takes a list of query strings and finds the best matching documents
+    for each of them. The queries are expanded in one batch, and scored
+    against the search model in one vectorized pass. '''
+
+    logging.info('Pre expansion: {}'.format(query_texts))
+
+    # Perform simple query expansion on the original queries.
+    queries = expand_queries(query_texts)
+
+    logging.info('Post expansion: {}'.format(queries))
+    annotate('expanded_queries', queries)
+
+    model = get_search_model()
+
+    engine = _get_engine(model, engine)
+    annotate('engine', [engine] * len(queries))
+    if engine != 'mongo':
+        return _search_model(model, query_texts, queries, url_style, engine)
+
+    return _search_mongo(model, query_texts, queries, url_style)
+
+
+def _perform_search(query_text, url_style, engine=RETRIEVAL_ENGINE):
+    ''' Takes a query string and finds the best matching document in the
+    database. '''
+    # A single query is a batch of one, so both give the same answers.
+    return _perform_searches([query_text], url_style, engine)[0]
+
+
+def _perform_batch(requests):
+    ''' Answers a batch of (query text, url style, trace) requests, collected
+    from several threads. The queries with the same url style are searched
+    together. '''
+    styles = collections.OrderedDict()
+    for i, (query_text, url_style, _) in enumerate(requests):
+        styles.setdefault(url_style, []).append(i)
+
+    responses = [None] * len(requests)
+    for url_style, indices in styles.items():
+        # The batch is answered by the thread of one of the requests, so it
+        # is traced on its own and added to the trace of every request.
+        traces = [requests[i][2] for i in indices]
+        with traced(any(trace is not None for trace in traces)) as trace:
+            results = _perform_searches([requests[i][0] for i in indices],
+                                        url_style)
+        if trace is not None:
+            split_trace(trace, traces)
+
+        for i, response in zip(indices, results):
+            responses[i] = response
+
+    return responses
 
 
 class QueryHandler:
+    # Shared by every handler, so that the queries of all the endpoints are
+    # batched together.
+    __scheduler = BatchScheduler(_perform_batch, BATCHING['max_size'],
+                                 BATCHING['window_ms'] / 1000)
+
     def get_response(self, query, url_style='plain', source='dev'):
         logging.info('Source: {}'.format(source))
-        response = _perform_search(query, url_style)
+        Metrics.get_instance().count_request(source)
+
+        # Trace the request, so that it can be logged if it turns out to be
+        # slow.
+        with traced(is_sampled()) as trace:
+            with timed('request'):
+                response = self.__get_response(query, url_style)
+
+        if trace is not None:
+            trace.details.update(query=query, source=source)
+            log_if_slow(trace)
+
         logging.info('Response: {}'.format(response))
         return response
+
+    def explain(self, query, url_style='plain', engine=None):
+        ''' Answers a query like get_response, bypassing the cache, and
+        explains how the response was found: how the query was expanded, the
+        scores of the candidates, which thresholds they passed and the time
+        spent in each stage. '''
+        engine = engine or RETRIEVAL_ENGINE
+        # The stages of an explanation are only added to its trace, so that
+        # they do not skew the latencies of the requests answered to users.
+        with traced(detailed=True, observed=False) as trace:
+            with timed('explain'):
+                response = _perform_search(query, url_style, engine)
+
+        return {
+            'query': query,
+            # The configured engine might not be usable yet.
+            'engine': trace.details['engine'][0],
+            'response': response,
+            'expanded_query': trace.details['expanded_queries'][0],
+            'expansion': trace.details.get('expansion', [None])[0],
+            'candidates': trace.details.get('scored_candidates', [[]])[0],
+            'thresholds': {'answer': ANSWER_THRESHOLD,
+                           'similarity': SIMILARITY_THRESHOLD},
+            'stages_ms': {stage: round(seconds * 1000, 3)
+                          for stage, seconds in trace.stages.items()}
+        }
+
+    def __get_response(self, query, url_style):
+        # The same questions are asked over and over again, so responses are
+        # cached until the content changes.
+        cache = ResponseCache.get_instance()
+        key = ResponseCache.get_key(query, url_style) \
+            if isinstance(query, str) else None
+
+        # The content version is read before the lookup, so that a response
+        # based on content changed meanwhile is not cached.
+        version = get_content_version()
+        response = cache.get(key) if key else None
+        if response is None:
+            response = self.__search(query, url_style)
+            if key:
+                cache.set(key, response, version)
+        elif response == NOT_FOUND:
+            # Still count unknown queries answered from the cache.
+            _handle_not_found(query)
+
+        return response
+
+    def __search(self, query, url_style):
+        ''' Answers a query, in a batch with the queries other threads are
+        answering at the same time if batching is enabled. A request which
+        arrives when no other query is being answered is not delayed. '''
+        if BATCHING['enabled'] and isinstance(query, str):
+            with timed('batched_search'):
+                return QueryHandler.__scheduler.submit(
+                    (query, url_style, get_trace()))
+
+        return _perform_search(query, url_style)
+
+    def get_responses(self, queries, url_style='plain', source='dev'):
+        ''' Returns the responses to a list of queries, in the same order.
+        Cached responses are reused, and the remaining queries are answered
+        in a single batch. '''
+        logging.info('Source: {}'.format(source))
+        Metrics.get_instance().count_request(source, len(queries))
+
+        with timed('batch_request'):
+            responses = self.__get_responses(queries, url_style)
+
+        logging.info('Responses: {}'.format(len(queries)))
+        return responses
+
+    def __get_responses(self, queries, url_style):
+        cache = ResponseCache.get_instance()
+        keys = [ResponseCache.get_key(query, url_style) for query in queries]
+
+        version = get_content_version()
+        responses = {}
+        misses = []
+        repeated = []
+        for query, key in zip(queries, keys):
+            if key in responses:
+                repeated.append((query, key))
+                continue
+
+            responses[key] = cache.get(key)
+            if responses[key] is None:
+                misses.append((query, key))
+            elif responses[key] == NOT_FOUND:
+                # Still count unknown queries answered from the cache.
+                _handle_not_found(query)
+
+        if misses:
+            results = _perform_searches([query for query, key in misses],
+                                        url_style)
+            for (query, key), response in zip(misses, results):
+                responses[key] = response
+                cache.set(key, response, version)
+
+        # A query asked more than once in the batch is only answered once,
+        # but every time it was asked counts as an unknown query.
+        for query, key in repeated:
+            if responses[key] == NOT_FOUND:
+                _handle_not_found(query)
+
+        return [responses[key] for key in keys]
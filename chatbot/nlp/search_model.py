@@ -0,0 +1,553 @@
+import argparse
+import collections
+import importlib
+import logging
+import os
+import pickle
+import threading
+import time
+import zlib
+
+import numpy as np
+import scipy.sparse
+
+from chatbot.nlp.cache import get_content_version, invalidate_responses, \
+    touch_stamp
+from chatbot.nlp.keyword import tokenize
+from chatbot.util.config_util import Config
+
+
+SEARCH_MODEL_FILE = Config.get_value(['query_system', 'search_model_file'])
+
+# Seconds between the checks for changed documents by watch_search_model.
+WATCH_INTERVAL = Config.get_value(['query_system',
+                                   'search_model_watch_interval'])
+
+RETRIEVAL_ENGINE = Config.get_value(['query_system', 'retrieval', 'engine'])
+TOP_K = Config.get_value(['query_system', 'retrieval', 'top_k'])
+BM25_K1 = Config.get_value(['query_system', 'retrieval', 'bm25', 'k1'])
+BM25_B = Config.get_value(['query_system', 'retrieval', 'bm25', 'b'])
+LSA_DIMENSIONS = Config.get_value(['query_system', 'retrieval', 'lsa',
+                                   'dimensions'])
+
+# The fields of a document the model is built from.
+MODEL_FIELDS = ['id', 'content.title', 'content.text', 'content.keywords',
+                'keywords', 'header_meta_keywords']
+
+
+def get_corpus_text(doc):
+    ''' Converts a document from the model into a string which will be used in
+    a corpus. '''
+    content = doc['content']['text']
+    return doc['content']['title'] + ' ' + content
+
+
+def get_keyword_text(doc):
+    ''' Joins the keywords of a document from the model into a string. Uses
+    the same fields as the text index in MongoDB. '''
+    keywords = list(doc.get('keywords', [])) + \
+        list(doc['content'].get('keywords', [])) + \
+        list(doc.get('header_meta_keywords', []))
+
+    # The keywords of the content are stored with their confidence.
+    keywords = [keyword['keyword'] if isinstance(keyword, dict) else keyword
+                for keyword in keywords]
+
+    return ' '.join(keyword for keyword in keywords if keyword)
+
+
+def _get_text_hash(text):
+    ''' Returns a cheap checksum of a corpus text, used to detect documents
+    which have changed since the model was built. '''
+    return zlib.crc32(text.encode('utf-8'))
+
+
+def _count_terms(text):
+    ''' Counts the terms in a text. The text is lowercased before it is
+    tokenized, like a CountVectorizer would do. '''
+    return collections.Counter(tokenize(text.lower()))
+
+
+def _get_count_matrix(counts, vocabulary):
+    ''' Converts a list of term counts into a sparse matrix with a column for
+    each term in the vocabulary. Terms not in the vocabulary are ignored. '''
+    rows, cols, data = [], [], []
+    for row, terms in enumerate(counts):
+        for term, count in terms.items():
+            col = vocabulary.get(term)
+            if col is not None:
+                rows.append(row)
+                cols.append(col)
+                data.append(count)
+
+    return scipy.sparse.csr_matrix((data, (rows, cols)), dtype=np.int64,
+                                   shape=(len(counts), len(vocabulary)))
+
+
+def _get_row_counts(matrix, row, terms):
+    ''' Converts a row of a count matrix back into term counts. '''
+    start, end = matrix.indptr[row], matrix.indptr[row + 1]
+    return collections.Counter({
+        terms[col]: int(count)
+        for col, count in zip(matrix.indices[start:end],
+                              matrix.data[start:end])
+    })
+
+
+def _get_bm25_postings(counts, k1=BM25_K1, b=BM25_B):
+    ''' Computes the BM25 weight of every term in every document. Returns a
+    sparse matrix with a row for each term, i.e. the posting list of that
+    term, so that a query only touches the rows of its own terms. '''
+    n_docs, n_terms = counts.shape
+    lengths = np.asarray(counts.sum(axis=1), dtype=np.float64).ravel()
+    avg_length = lengths.mean() if n_docs and lengths.mean() > 0 else 1.0
+
+    # Number of documents containing each term. The +1 keeps the IDF
+    # positive for terms occurring in more than half of the documents.
+    doc_freqs = np.bincount(counts.indices, minlength=n_terms)
+    idf = np.log(1 + (n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5))
+
+    coo = counts.tocoo()
+    freqs = coo.data.astype(np.float64)
+    norms = k1 * (1 - b + b * lengths[coo.row] / avg_length)
+    weights = idf[coo.col] * freqs * (k1 + 1) / (freqs + norms)
+
+    return scipy.sparse.csr_matrix((weights, (coo.col, coo.row)),
+                                   shape=(n_terms, n_docs))
+
+
+def _sklearn(module, name):
+    ''' Returns a class from a module of scikit-learn, which is imported on
+    first use. Scikit-learn is slow to import, and only needed to build a
+    model, not to load or query one. '''
+    return getattr(importlib.import_module('sklearn.' + module), name)
+
+
+def _get_lsa(matrix, dimensions=LSA_DIMENSIONS):
+    ''' Projects the TF-IDF matrix into latent semantic dimensions using a
+    truncated SVD. Returns the fitted SVD and the L2-normalized document
+    vectors as a dense float32 array, or None for both if the corpus is too
+    small to be projected. '''
+    dimensions = min(dimensions, matrix.shape[0] - 1, matrix.shape[1] - 1)
+    if dimensions < 1:
+        return None, None
+
+    # Use a fixed seed, so that rebuilding the model gives the same result.
+    svd = _sklearn('decomposition', 'TruncatedSVD')(n_components=dimensions,
+                                                    random_state=0)
+    vectors = svd.fit_transform(matrix).astype(np.float32)
+
+    return svd, _normalize_rows(vectors)
+
+
+def _normalize_rows(vectors):
+    ''' L2-normalizes the rows of a dense array in place. '''
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    vectors /= norms
+    return vectors
+
+
+def _top_k(scores, k):
+    ''' Returns the positions of the k highest positive scores, best first.
+    Only the top k are sorted, so this is linear in the number of scores. '''
+    hits = np.flatnonzero(scores > 0)
+    if len(hits) > k:
+        hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+    return hits[np.argsort(-scores[hits], kind='stable')]
+
+
+class SearchModel:
+    ''' A TF-IDF model over every document the query system can answer with.
+    The model is built once when documents are inserted, which means that a
+    query only has to be transformed and compared with the stored document
+    matrix, and that the IDF weights do not depend on which candidates
+    MongoDB returned for a specific query.
+
+    The model also holds an inverted index with BM25 weights over the texts
+    and keywords of the documents. It can replace the text search in MongoDB
+    for retrieving the candidates of a query, in which case MongoDB is only
+    used to fetch the documents of the final answers.
+
+    Alternatively, candidates can be retrieved by comparing the queries with
+    the documents in a latent semantic space, which finds documents using
+    related terms rather than the exact terms of the query. The space is
+    costly to build, so it is only built if asked for. '''
+
+    def __init__(self, ids, sources, hashes, terms, counts, keyword_counts,
+                 lsa=False):
+        self.ids = ids
+        self.sources = sources
+        self.hashes = hashes
+        self.rows = {idx: row for row, idx in enumerate(ids)}
+
+        # Term counts of the texts and the keywords of each document, which
+        # are kept so that unchanged documents are not tokenized again when
+        # the model is rebuilt.
+        self.terms = terms
+        self.counts = counts
+        self.keyword_counts = keyword_counts
+        self.vocabulary = {term: col for col, term in enumerate(terms)}
+
+        # The TF-IDF model only uses terms found in the texts, so that the
+        # weights are the same as keyword.get_tfidf_model would give.
+        text_cols = np.unique(counts.indices)
+        self.text_vocabulary = {terms[col]: i
+                                for i, col in enumerate(text_cols)}
+        self.transformer = _sklearn('feature_extraction.text',
+                                    'TfidfTransformer')(sublinear_tf=True)
+        self.matrix = self.transformer.fit_transform(
+            counts[:, text_cols]).tocsr()
+
+        self.postings = _get_bm25_postings(counts + keyword_counts)
+        self.svd, self.lsa_matrix = _get_lsa(self.matrix) if lsa \
+            else (None, None)
+
+    @staticmethod
+    def build(docs, sources=None, previous=None, lsa=False):
+        ''' Builds a new model on a list of documents from the model, and the
+        collection each of them was found in. Documents which are unchanged
+        since the previous model reuse the terms counted by that model. The
+        latent semantic space is only built if lsa is set.
+
+        Returns None if the texts of the documents have no terms at all, as
+        there is nothing to build a model on. '''
+        texts = [get_corpus_text(doc) for doc in docs]
+        keyword_texts = [get_keyword_text(doc) for doc in docs]
+        hashes = [(_get_text_hash(text), _get_text_hash(keyword_text))
+                  for text, keyword_text in zip(texts, keyword_texts)]
+
+        counts, keyword_counts = [], []
+        for doc, text, keyword_text, text_hashes in zip(docs, texts,
+                                                        keyword_texts, hashes):
+            row = previous.rows.get(doc['id']) if previous else None
+            old_hashes = previous.hashes[row] if row is not None else (0, 0)
+
+            # Count the terms of each document using our custom tokenizer,
+            # unless they were already counted.
+            if row is not None and old_hashes[0] == text_hashes[0]:
+                counts.append(_get_row_counts(previous.counts, row,
+                                              previous.terms))
+            else:
+                counts.append(_count_terms(text))
+
+            if row is not None and old_hashes[1] == text_hashes[1]:
+                keyword_counts.append(_get_row_counts(
+                    previous.keyword_counts, row, previous.terms))
+            else:
+                keyword_counts.append(_count_terms(keyword_text))
+
+        if not any(counts):
+            return None
+
+        terms = sorted(set().union(*counts, *keyword_counts))
+        vocabulary = {term: col for col, term in enumerate(terms)}
+
+        return SearchModel([doc['id'] for doc in docs],
+                           sources or [None] * len(docs), hashes, terms,
+                           _get_count_matrix(counts, vocabulary),
+                           _get_count_matrix(keyword_counts, vocabulary), lsa)
+
+    def __transform_counts(self, counts):
+        ''' Transforms a list of term counts into L2-normalized TF-IDF
+        vectors. '''
+        return self.transformer.transform(
+            _get_count_matrix(counts, self.text_vocabulary))
+
+    def transform(self, texts):
+        ''' Transforms a list of texts into L2-normalized TF-IDF vectors. '''
+        return self.__transform_counts([_count_terms(text) for text in texts])
+
+    def get_rows(self, docs):
+        ''' Returns the row of each document in the model, or None for
+        documents which are not part of the model or which have changed
+        since the model was built. '''
+        rows = []
+        for doc in docs:
+            row = self.rows.get(doc.get('id'))
+            text_hash = _get_text_hash(get_corpus_text(doc))
+            rows.append(row if row is not None and
+                        self.hashes[row][0] == text_hash else None)
+        return rows
+
+    def score(self, queries, docs_list):
+        ''' Returns the cosine similarity between each query and each of its
+        candidate documents, as an array per query. All the queries are
+        compared with every document in the model using a single sparse
+        matrix product. '''
+        query_matrix = self.transform(queries)
+
+        # Both the queries and the documents are L2-normalized, so the dot
+        # product is the cosine similarity.
+        similarities = (query_matrix * self.matrix.T).tocsr()
+
+        result = []
+        for i, docs in enumerate(docs_list):
+            rows = self.get_rows(docs)
+            current = [j for j, row in enumerate(rows) if row is not None]
+            stale = [j for j, row in enumerate(rows) if row is None]
+
+            scores = np.zeros(len(docs))
+            scores[current] = similarities[i].toarray()[0][
+                [rows[j] for j in current]]
+
+            if stale:
+                # Transform documents which are not up to date in the model
+                # on the fly.
+                vectors = self.transform([get_corpus_text(docs[j])
+                                          for j in stale])
+                scores[stale] = (vectors * query_matrix[i].T).toarray()[:, 0]
+
+            result.append(scores)
+
+        return result
+
+    def __search_bm25(self, counts, k):
+        ''' Returns the rows of the k documents with the highest BM25 score
+        for the term counts of a query. '''
+        terms = [(self.vocabulary[term], count)
+                 for term, count in counts.items() if term in self.vocabulary]
+        if not terms:
+            return np.array([], dtype=np.int64)
+
+        # Add up the posting lists of the terms in the query.
+        cols, weights = zip(*terms)
+        scores = self.postings[list(cols)].T.dot(
+            np.array(weights, dtype=np.float64))
+
+        return _top_k(scores, k)
+
+    def __search_lsa(self, query_matrix, k):
+        ''' Returns the rows of the k documents closest to each query in the
+        latent semantic space. '''
+        vectors = _normalize_rows(
+            self.svd.transform(query_matrix).astype(np.float32))
+
+        # A dense matrix-vector product per query.
+        return [_top_k(self.lsa_matrix.dot(vector), k) for vector in vectors]
+
+    def search(self, queries, engine='bm25', k=TOP_K):
+        ''' Retrieves the top k candidate documents for each query, either by
+        their BM25 score in the inverted index or by their similarity in the
+        latent semantic space. Returns the rows of the candidates for each
+        query, together with their cosine similarity with the query, so that
+        they can be ranked the same way as in score. '''
+        query_counts = [_count_terms(query) for query in queries]
+        query_matrix = self.__transform_counts(query_counts)
+
+        # Both the queries and the documents are L2-normalized, so the dot
+        # product is the cosine similarity.
+        similarities = (query_matrix * self.matrix.T).tocsr()
+
+        # The latent semantic space is not available for tiny corpora.
+        if engine == 'lsa' and self.svd is not None:
+            candidates = self.__search_lsa(query_matrix, k)
+        else:
+            candidates = [self.__search_bm25(counts, k)
+                          for counts in query_counts]
+
+        rows_list, scores_list = [], []
+        for i, rows in enumerate(candidates):
+            rows_list.append(rows.tolist())
+            scores_list.append(similarities[i].toarray()[0][rows])
+
+        return rows_list, scores_list
+
+    def get_documents(self, factory, rows, fields=None):
+        ''' Fetches the documents in the given rows from MongoDB, with one
+        query per collection, only including the given fields if any. Returns
+        a dict from row to document, leaving out documents which have been
+        deleted since the model was built. '''
+        source_rows = collections.defaultdict(list)
+        for row in set(rows):
+            source_rows[self.sources[row]].append(row)
+
+        docs = {}
+        for source, rows in source_rows.items():
+            ids = [self.ids[row] for row in rows]
+            found = {doc['id']: doc for doc in factory.find_documents(
+                {'id': {'$in': ids}}, source, fields)}
+
+            for row in rows:
+                if self.ids[row] in found:
+                    docs[row] = found[self.ids[row]]
+
+        return docs
+
+    def save(self, path=SEARCH_MODEL_FILE):
+        ''' Stores the model on disk. The file is replaced atomically, as it
+        might be read by other processes at the same time. '''
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        temp_path = '{}.{}.{}.tmp'.format(path, os.getpid(),
+                                          threading.get_ident())
+        with open(temp_path, 'wb') as model_file:
+            pickle.dump(self, model_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def load(path=SEARCH_MODEL_FILE):
+        ''' Loads a model stored on disk. '''
+        with open(path, 'rb') as model_file:
+            return pickle.load(model_file)
+
+
+def get_effective_documents(factory):
+    ''' Returns every document the query system can answer with, i.e. the
+    prod documents which have not been manually changed, and all the manually
+    changed documents, as (collection, document) tuples. Only the fields the
+    model is built from are fetched. '''
+    prod_col = Config.get_mongo_collection('prod')
+    manual_col = Config.get_mongo_collection('manual')
+    projection = dict({field: 1 for field in MODEL_FIELDS}, _id=0)
+
+    docs = [(prod_col, doc) for doc in factory.get_collection(prod_col)
+            .find({'manually_changed': {'$ne': True}}, projection)]
+    docs += [(manual_col, doc)
+             for doc in factory.get_collection(manual_col).find({},
+                                                                projection)]
+
+    return docs
+
+
+# Only one thread of a process rebuilds the model at a time, so that a build
+# started earlier never replaces the model of a build started later.
+_build_lock = threading.Lock()
+
+
+def build_search_model(factory, path=SEARCH_MODEL_FILE, previous=None,
+                       lsa=RETRIEVAL_ENGINE == 'lsa'):
+    ''' Builds a new search model over the effective document set and stores
+    it on disk, where it will be picked up by the query system. The latent
+    semantic space is only built if it is used to answer queries.
+
+    If there is nothing to build a model on, the stored model is removed, so
+    that the query system does not answer with documents which are gone.
+    Returns None in that case. '''
+    with _build_lock:
+        docs = [(source, doc)
+                for source, doc in get_effective_documents(factory)
+                if 'id' in doc and 'content' in doc]
+
+        model = SearchModel.build([doc for source, doc in docs],
+                                  [source for source, doc in docs], previous,
+                                  lsa)
+        if model is None:
+            logging.warning('No documents with any terms, removing the '
+                            'search model')
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+
+        model.save(path)
+
+    return model
+
+
+def update_search_model(factory, path=SEARCH_MODEL_FILE,
+                        lsa=RETRIEVAL_ENGINE == 'lsa'):
+    ''' Rebuilds the stored search model after documents have been changed,
+    only counting the terms of the documents which changed. '''
+    return build_search_model(factory, path, get_search_model(path), lsa)
+
+
+def _get_stale_path(path):
+    ''' Returns the stamp file marking the model in the given path as stale.
+    '''
+    return path + '.stale'
+
+
+def mark_search_model_stale(path=SEARCH_MODEL_FILE):
+    ''' Records that the documents have changed since the search model was
+    built. The model is then rebuilt by watch_search_model, which runs in a
+    process of its own, so that rebuilding it never slows down the processes
+    answering queries. '''
+    touch_stamp(_get_stale_path(path))
+
+
+def watch_search_model(factory, path=SEARCH_MODEL_FILE,
+                       interval=WATCH_INTERVAL, lsa=RETRIEVAL_ENGINE == 'lsa'):
+    ''' Rebuilds the stored search model whenever it has been marked as
+    stale, until interrupted. Changes made while the model is rebuilt are
+    picked up by the next rebuild. Cached responses are invalidated once the
+    new model has replaced the old one. '''
+    stale_path = _get_stale_path(path)
+
+    # Changes made before the model was last built have been handled.
+    handled = get_content_version(stale_path)
+    if handled > get_content_version(path):
+        handled = None
+
+    while True:
+        version = get_content_version(stale_path)
+        if version != handled:
+            try:
+                update_search_model(factory, path, lsa)
+                invalidate_responses()
+                handled = version
+            except Exception:
+                # Retried after the interval.
+                logging.exception('Failed to update the search model')
+
+        time.sleep(interval)
+
+
+# The currently loaded model, and the modification time of the file it was
+# loaded from. Replaced as a whole, so threads always see a matching pair.
+_loaded_model = (None, None)
+_load_lock = threading.Lock()
+
+
+def get_search_model(path=SEARCH_MODEL_FILE):
+    ''' Returns the stored search model, or None if no model has been built
+    yet. The model is reloaded whenever the file on disk is replaced. '''
+    global _loaded_model
+
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    model, loaded_mtime = _loaded_model
+    if loaded_mtime != mtime:
+        with _load_lock:
+            # Another thread might have loaded it while this one waited.
+            model, loaded_mtime = _loaded_model
+            if loaded_mtime != mtime:
+                logging.info('Loading search model from {}'.format(path))
+                model = SearchModel.load(path)
+                _loaded_model = (model, mtime)
+
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Builds the search model used by the query system from '
+                    'the documents in the database.')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running, rebuilding the model whenever '
+                             'documents are changed through the API')
+    parser.add_argument('--lsa', action='store_true',
+                        default=RETRIEVAL_ENGINE == 'lsa',
+                        help='Also build the latent semantic space, which is '
+                             'only built by default for the lsa engine')
+    args = parser.parse_args()
+
+    from chatbot.model.model_factory import ModelFactory
+    factory = ModelFactory.get_instance()
+    factory.set_db()
+
+    if args.watch:
+        watch_search_model(factory, lsa=args.lsa)
+    else:
+        update_search_model(factory, lsa=args.lsa)
+        invalidate_responses()
+
+
+if __name__ == '__main__':
+    main()
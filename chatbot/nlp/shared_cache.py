@@ -0,0 +1,153 @@
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+from chatbot.util.config_util import Config
+
+
+SHARED_CACHE = Config.get_value(['query_system', 'response_cache', 'shared'])
+
+# Header of each slot in the shared table: hash of the key, content version,
+# expiry time and length of the payload.
+_SLOT_HEADER = struct.Struct('<QqdI')
+
+
+def _hash_key(key):
+    ''' A hash of the key which is the same in every process, unlike the
+    builtin hash of strings. '''
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class MmapCache:
+    ''' A hash table in a memory mapped file, shared by all processes on a
+    host which map the same file. Placing the file in /dev/shm keeps it in
+    shared memory.
+
+    The table has a fixed number of slots of a fixed size, and each key can
+    only be stored in one slot, overwriting whatever was stored there before.
+    Each slot is protected by a lock on its byte range of the file. Those
+    locks are held by the process, so threads of the same process also take
+    a lock of their own. '''
+
+    def __init__(self, path, slots, slot_size):
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = slots * slot_size
+        if os.fstat(self.fd).st_size != size:
+            os.ftruncate(self.fd, size)
+        self.table = mmap.mmap(self.fd, size)
+        self.thread_lock = threading.Lock()
+
+    def __lock(self, offset, operation):
+        fcntl.lockf(self.fd, operation, self.slot_size, offset, os.SEEK_SET)
+
+    def __acquire(self, offset, operation):
+        self.thread_lock.acquire()
+        try:
+            self.__lock(offset, operation)
+        except BaseException:
+            self.thread_lock.release()
+            raise
+
+    def __release(self, offset):
+        try:
+            self.__lock(offset, fcntl.LOCK_UN)
+        finally:
+            self.thread_lock.release()
+
+    def get(self, key, version):
+        ''' Returns the value stored for the key with the given content
+        version, or None. '''
+        key_hash = _hash_key(key)
+        offset = (key_hash % self.slots) * self.slot_size
+
+        self.__acquire(offset, fcntl.LOCK_SH)
+        try:
+            header = _SLOT_HEADER.unpack_from(self.table, offset)
+            slot_hash, slot_version, expires, length = header
+            if slot_hash != key_hash or slot_version != version:
+                return None
+
+            start = offset + _SLOT_HEADER.size
+            payload = self.table[start:start + length]
+        finally:
+            self.__release(offset)
+
+        if expires < time.time():
+            return None
+
+        stored_key, value = json.loads(payload.decode('utf-8'))
+        return value if stored_key == key else None
+
+    def set(self, key, value, version, ttl):
+        ''' Stores a value for the key. Values which do not fit in a slot are
+        not stored. '''
+        payload = json.dumps([key, value]).encode('utf-8')
+        if _SLOT_HEADER.size + len(payload) > self.slot_size:
+            return
+
+        key_hash = _hash_key(key)
+        offset = (key_hash % self.slots) * self.slot_size
+        header = (key_hash, version, time.time() + ttl, len(payload))
+
+        self.__acquire(offset, fcntl.LOCK_EX)
+        try:
+            _SLOT_HEADER.pack_into(self.table, offset, *header)
+            start = offset + _SLOT_HEADER.size
+            self.table[start:start + len(payload)] = payload
+        finally:
+            self.__release(offset)
+
+
+class UwsgiCache:
+    ''' The shared cache of uWSGI, configured with the cache2 option. Only
+    available when running under uWSGI. '''
+
+    def __init__(self, name):
+        import uwsgi
+
+        self.uwsgi = uwsgi
+        self.name = name
+
+    def get(self, key, version):
+        ''' Returns the value stored for the key with the given content
+        version, or None. '''
+        payload = self.uwsgi.cache_get(key, self.name)
+        if payload is None:
+            return None
+
+        stored_version, value = json.loads(payload.decode('utf-8'))
+        return value if stored_version == version else None
+
+    def set(self, key, value, version, ttl):
+        ''' Stores a value for the key, expiring after ttl seconds. '''
+        payload = json.dumps([version, value]).encode('utf-8')
+        self.uwsgi.cache_update(key, payload, int(ttl), self.name)
+
+
+def get_shared_cache(settings=SHARED_CACHE):
+    ''' Creates the shared cache backend given in the settings, or returns
+    None if the backend is disabled or not available on this host. '''
+    backend = settings['backend']
+
+    try:
+        if backend == 'mmap':
+            return MmapCache(settings['path'], settings['slots'],
+                             settings['slot_size'])
+        elif backend == 'uwsgi':
+            return UwsgiCache(settings['name'])
+    except (ImportError, OSError) as e:
+        logging.warning('Shared response cache {} is not available: {}'
+                        .format(backend, e))
+
+    return None
@@ -0,0 +1,256 @@
+import itertools
+import json
+import string
+import threading
+
+
+SPELLING_DICTIONARY_FILE = 'chatbot/nlp/statics/no_50k.json'
+
+# Characters which can be part of a string Python is able to parse as a
+# float, apart from digits and whitespace.
+_FLOAT_CHARS = set('+-._eEnNaAiIfFtTyY')
+
+
+def _should_check(word):
+    ''' Numbers and single punctuation characters are never corrected. This
+    is the same rule as pyspellchecker uses. '''
+    if len(word) == 1 and word in string.punctuation:
+        return False
+    try:
+        float(word)
+        return False
+    except ValueError:
+        return True
+
+
+def _may_reach_unchecked(word, distance):
+    ''' Returns False if no number or punctuation character can be within the
+    given edit distance of the word. Used to avoid generating edits for the
+    vast majority of words. '''
+    if len(word) <= distance + 1:
+        return True
+
+    others = sum(1 for char in word
+                 if not (char.isdigit() or char.isspace()
+                         or char in _FLOAT_CHARS))
+    return others <= distance
+
+
+def _deletes(word, distance):
+    ''' Returns every string which can be created by deleting up to distance
+    characters from the word, including the word itself. '''
+    result = {word}
+    edits = [word]
+    for _ in range(distance):
+        edits = [edit[:i] + edit[i + 1:]
+                 for edit in edits for i in range(len(edit))]
+        result.update(edits)
+    return result
+
+
+def _edits(word, letters):
+    ''' All strings one edit away from the word, using the given letters. '''
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    deletes = [left + right[1:] for left, right in splits if right]
+    transposes = [left + right[1] + right[0] + right[2:]
+                  for left, right in splits if len(right) > 1]
+    replaces = [left + char + right[1:]
+                for left, right in splits if right for char in letters]
+    inserts = [left + char + right for left, right in splits
+               for char in letters]
+    return set(deletes + transposes + replaces + inserts)
+
+
+def damerau_levenshtein(first, second):
+    ''' The (unrestricted) Damerau-Levenshtein distance between two strings,
+    which is the smallest number of insertions, deletions, substitutions and
+    transpositions of adjacent characters turning one string into the other.
+    '''
+    infinity = len(first) + len(second)
+    last_row = {}
+
+    matrix = [[infinity] * (len(second) + 2)]
+    matrix += [[infinity] + list(range(len(second) + 1))]
+    matrix += [[infinity, i] + [0] * len(second)
+               for i in range(1, len(first) + 1)]
+
+    for i in range(1, len(first) + 1):
+        last_match = 0
+        for j in range(1, len(second) + 1):
+            k = last_row.get(second[j - 1], 0)
+            l, cost = last_match, 1
+            if first[i - 1] == second[j - 1]:
+                last_match, cost = j, 0
+
+            matrix[i + 1][j + 1] = min(
+                matrix[i][j] + cost,
+                matrix[i + 1][j] + 1,
+                matrix[i][j + 1] + 1,
+                matrix[k][l] + (i - k - 1) + 1 + (j - l - 1))
+        last_row[first[i - 1]] = i
+
+    return matrix[len(first) + 1][len(second) + 1]
+
+
+def _bounded_distance(first, second, limit):
+    ''' The optimal string alignment distance between two strings, which is
+    the Damerau-Levenshtein distance where no substring is edited more than
+    once. Returns limit + 1 as soon as the distance is known to exceed limit.
+    '''
+    # Strip the common prefix and suffix, which do not affect the distance.
+    while first and second and first[0] == second[0]:
+        first, second = first[1:], second[1:]
+    while first and second and first[-1] == second[-1]:
+        first, second = first[:-1], second[:-1]
+
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+
+    previous, current = None, list(range(len(second) + 1))
+    for i in range(1, len(first) + 1):
+        previous, current = current, [i] + [0] * len(second)
+        for j in range(1, len(second) + 1):
+            cost = 0 if first[i - 1] == second[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1,
+                             previous[j - 1] + cost)
+            if (i > 1 and j > 1 and first[i - 1] == second[j - 2]
+                    and first[i - 2] == second[j - 1]):
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        before = previous
+
+    return current[-1]
+
+
+class SpellingCorrector:
+    ''' Spelling correction based on a precomputed index of deletes, as in
+    SymSpell. Every dictionary word is indexed by all the strings created by
+    deleting up to two characters from its prefix, so finding candidates for
+    a misspelled word only requires generating the deletes of that word.
+
+    The corrections are the same as the ones given by pyspellchecker with an
+    edit distance of two, which was used earlier: the most frequent word
+    at the smallest edit distance. '''
+    __instance = None
+    __lock = threading.Lock()
+
+    MAX_DISTANCE = 2
+    PREFIX_LENGTH = 7
+
+    @staticmethod
+    def get_instance():
+        ''' Static access method '''
+        if SpellingCorrector.__instance is None:
+            with SpellingCorrector.__lock:
+                if SpellingCorrector.__instance is None:
+                    SpellingCorrector()
+        return SpellingCorrector.__instance
+
+    def __init__(self):
+        ''' Virtually private constructor '''
+        if SpellingCorrector.__instance is not None:
+            raise Exception('This class is a singleton!')
+        else:
+            self.__read_dictionary(SPELLING_DICTIONARY_FILE)
+            SpellingCorrector.__instance = self
+
+    def __read_dictionary(self, path):
+        ''' Reads a dictionary of word frequencies and builds the index of
+        deletes. '''
+        with open(path) as dictionary_file:
+            # Words are case insensitive, later entries overwriting earlier
+            # ones.
+            self.words = {word.lower(): frequency for word, frequency
+                          in json.load(dictionary_file).items()}
+
+        self.letters = set(itertools.chain.from_iterable(self.words))
+
+        # Maps each delete to the words it was created from. A single word is
+        # stored as a string rather than a list to save memory.
+        self.deletes = {}
+        for word in self.words:
+            prefix = word[:self.PREFIX_LENGTH]
+            for delete in _deletes(prefix, self.MAX_DISTANCE):
+                entry = self.deletes.get(delete)
+                if entry is None:
+                    self.deletes[delete] = word
+                elif isinstance(entry, str):
+                    self.deletes[delete] = [entry, word]
+                else:
+                    entry.append(word)
+
+    def known(self, word):
+        ''' Returns True if the word does not need to be corrected. '''
+        word = word.lower()
+        return word in self.words or not _should_check(word)
+
+    def candidates(self, word):
+        ''' Returns the dictionary words which might be within the maximum
+        edit distance of the given lowercase word, mapped to their optimal
+        string alignment distance. That distance is cheaper to compute than
+        the true distance, and only differs from it when it is one more than
+        the maximum edit distance. '''
+        found = set()
+        prefix = word[:self.PREFIX_LENGTH]
+
+        for delete in _deletes(prefix, self.MAX_DISTANCE):
+            entry = self.deletes.get(delete)
+            if entry is None:
+                continue
+            found.update([entry] if isinstance(entry, str) else entry)
+
+        result = {}
+        for candidate in found:
+            distance = _bounded_distance(word, candidate,
+                                         self.MAX_DISTANCE + 1)
+            if distance <= self.MAX_DISTANCE + 1:
+                result[candidate] = distance
+
+        return result
+
+    def __best(self, words):
+        ''' Returns the most frequent of the given words. Ties are broken
+        alphabetically to make the result deterministic. '''
+        return min(words, key=lambda word: (-self.words.get(word, 0), word))
+
+    def correction(self, word):
+        ''' The most probable correct spelling of the word. Words which are
+        already in the dictionary, or have no correction, are returned
+        unchanged. '''
+        if self.known(word):
+            return word
+
+        original = word
+        word = word.lower()
+        candidates = self.candidates(word)
+
+        for distance in range(1, self.MAX_DISTANCE + 1):
+            matches = [candidate for candidate, candidate_distance
+                       in candidates.items() if candidate_distance == distance]
+
+            # Only compute the true distance when nothing closer was found.
+            if distance == self.MAX_DISTANCE:
+                matches += [candidate for candidate, candidate_distance
+                            in candidates.items()
+                            if candidate_distance == distance + 1 and
+                            damerau_levenshtein(word, candidate) == distance]
+
+            if matches:
+                return self.__best(matches)
+
+            # Numbers and punctuation are treated as known words with no
+            # frequency, so they are only chosen when no dictionary word is
+            # this close.
+            if _may_reach_unchecked(word, distance):
+                edits = {word}
+                for _ in range(distance):
+                    edits = set(itertools.chain.from_iterable(
+                        _edits(edit, self.letters) if _should_check(edit)
+                        else [edit] for edit in edits))
+
+                unchecked = [edit for edit in edits if not _should_check(edit)]
+                if unchecked:
+                    return self.__best(unchecked)
+
+        return original
@@ -1,5 +1,5 @@
-import copy
 import json
+import threading
 
 from chatbot.util.config_util import Config
 from chatbot.nlp.keyword import lemmatize
@@ -12,12 +12,18 @@ class SynsetWrapper():
     ''' Wrapper for a custom synset list. Interfaces with a text file where
     each line consists of synonyms split by comma '''
     __instance = None
+    __lock = threading.Lock()
+    # Reloads are serialized, so that a reload reading an older file never
+    # replaces the index of a newer one.
+    __reload_lock = threading.Lock()
 
     @staticmethod
     def get_instance():
         ''' Static access method '''
         if SynsetWrapper.__instance is None:
-            SynsetWrapper()
+            with SynsetWrapper.__lock:
+                if SynsetWrapper.__instance is None:
+                    SynsetWrapper()
         return SynsetWrapper.__instance
 
     def __init__(self):
@@ -29,20 +35,34 @@ class SynsetWrapper():
             SynsetWrapper.__instance = self
 
     def get_synset(self, token):
-        ''' Return a synset for a given token '''
-        return next((copy.deepcopy(synset) for synset in self.synset_list
-                    if token in synset), None)
+        ''' Return the synset for a given token as a frozenset, or None if
+        the token is not part of any synset. The first synset in the file
+        containing the token is used. '''
+        synsets, index = self.__index
+        synset_id = index.get(token)
+        return synsets[synset_id] if synset_id is not None else None
 
     @staticmethod
     def synset_file_updated():
         ''' Updates the cached synset list whenever the textfile is updated '''
-        SynsetWrapper.get_instance().__read_synset_file()
+        instance = SynsetWrapper.get_instance()
+        with SynsetWrapper.__reload_lock:
+            instance.__read_synset_file()
 
     def __read_synset_file(self):
-        ''' Read the contents of the synset file and add them to the
-        synset_list '''
+        ''' Read the contents of the synset file and build an index from each
+        token to the synset it belongs to '''
         with open(SYNSET_FILE) as synset_file:
-            self.synset_list = [
-                [lemmatize(*token)[0] for token in synset]
+            synsets = tuple(
+                frozenset(lemmatize(*token)[0] for token in synset)
                 for synset in json.load(synset_file)
-            ]
+            )
+
+        index = {}
+        for synset_id, synset in enumerate(synsets):
+            for token in synset:
+                index.setdefault(token, synset_id)
+
+        # Replace the synsets and the index in a single assignment, so that
+        # requests being served during a reload never see a mix of the two.
+        self.__index = (synsets, index)
@@ -0,0 +1,59 @@
+import sys
+import time
+
+from chatbot.nlp.query import _perform_search
+from chatbot.nlp.test.evaluation import evaluate_test, load_tests
+from chatbot.util.latency import get_percentile
+
+
+ENGINES = ['mongo', 'bm25', 'lsa']
+
+
+def benchmark_engine(tests, engine):
+    """
+    Runs the evaluation with one retrieval engine, timing every question.
+    :return: the latencies in milliseconds, the number of questions, the
+    text score and the url score.
+    """
+    latencies = []
+
+    def search(question, url_style):
+        start = time.perf_counter()
+        answer = _perform_search(question, url_style, engine)
+        latencies.append((time.perf_counter() - start) * 1000)
+        return answer
+
+    # Warm up, so that loading the models is not part of the timings.
+    _perform_search('husleie', 'plain', engine)
+
+    n_questions, score, url_score = 0, 0, 0
+    for test in tests:
+        partial_n, partial_score, partial_url = evaluate_test(test, search,
+                                                              verbose=False)
+        n_questions += partial_n
+        score += partial_score
+        url_score += partial_url
+
+    return latencies, n_questions, score, url_score
+
+
+def main(engines):
+    tests = load_tests()
+
+    print("{:<8}{:>10}{:>10}{:>10}{:>10}{:>10}".format(
+        "Engine", "p50 ms", "p95 ms", "max ms", "Text", "URL"))
+
+    for engine in engines:
+        latencies, n_questions, score, url_score = benchmark_engine(tests,
+                                                                    engine)
+        print("{:<8}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.3f}{:>10.3f}".format(
+            engine,
+            get_percentile(latencies, 50),
+            get_percentile(latencies, 95),
+            max(latencies),
+            score / n_questions,
+            url_score / n_questions))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or ENGINES)
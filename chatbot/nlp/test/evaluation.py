@@ -1,10 +1,43 @@
+import argparse
 import json
+import multiprocessing
+import os
+import time
+
 from chatbot.nlp.query import _perform_search
+from chatbot.util.latency import get_latencies
+
+
+TESTS_FILE = "chatbot/nlp/test/test_data/test_data_evaluation.json"
+
+
+def score_answer(test, answer):
+    """
+    :param test: a dictionary containing a question key and answers key.
+    :param answer: the answer our system gave to one of the questions.
+    :return: the text score between 0 and 1, and 1 if the answer contains
+    one of the correct urls, otherwise 0.
+    """
+    score_url = 0
+    for correct_url in test["urls"]:
+        if correct_url in answer:
+            score_url = 1
+
+    score_question = 0
+    for correct_answer in test["answers"]:
+        if correct_answer["text"] in answer:
+            # Max here, because the maximum score for score_question should
+            # be 1.
+            score_question = max(score_question, correct_answer["score"])
+
+    return score_question, score_url
 
 
-def evaluate_test(test):
+def evaluate_test(test, search=_perform_search, verbose=True):
     """
     :param test: a dictionary containing a question key and answers key.
+    :param search: the function answering a question with a url style.
+    :param verbose: print the questions which were not answered correctly.
     :return: A score between 0 and 1.
     """
     questions = test["question"]
@@ -17,59 +50,144 @@ def evaluate_test(test):
 
     for question in questions:
         # The answer our system gave.
-        our_answer = _perform_search(question, 'plain')
+        our_answer = search(question, 'plain')
         # The score for this specific question.
-        score_question = 0
-        score_url = 0
-        for correct_url in test["urls"]:
-            if correct_url in our_answer:
-                score_url = 1
-        if score_url == 0:
+        score_question, score_url = score_answer(test, our_answer)
+        if score_url == 0 and verbose:
             print("\nOur answer was", our_answer)
             print("\nCorrect URL was", test["urls"])
         url_score += score_url
-
-        correct_answers = test["answers"]
-        for correct_answer in correct_answers:
-            if correct_answer["text"] in our_answer:
-                # Max here, because the maximum score for score_question should
-                # be 1.
-                score_question = max(score_question, correct_answer["score"])
         score += score_question
 
-        if score_question < 1:
+        if score_question < 1 and verbose:
             print("Question:\n", question)
             print()
             print("Gave:\n", our_answer)
             print()
-            print("Correct:\n", correct_answers)
+            print("Correct:\n", test["answers"])
             print("\n\n\n\n")
 
     return n_questions, score, url_score
 
 
-def main():
-    f = open("chatbot/nlp/test/test_data/test_data_evaluation.json")
+def load_tests(path=TESTS_FILE):
+    f = open(path)
     raw_file = f.read()
     f.close()
-    tests = json.loads(raw_file)
+    return json.loads(raw_file)
 
-    n_questions = 0
-    score = 0
-    url_score = 0
 
-    for test in tests:
-        partial_n, partial_score, partial_url = evaluate_test(test)
-        n_questions += partial_n
-        score += partial_score
-        url_score += partial_url
+def _init_worker():
+    """ Loads the models in a worker process before it gets any questions,
+    so that loading them is not part of the latencies. """
+    _perform_search('husleie', 'plain')
+
+
+def _answer_question(question):
+    """ Answers a question, timing it. Runs in the worker processes. """
+    start = time.perf_counter()
+    answer = _perform_search(question, 'plain')
+    return answer, (time.perf_counter() - start) * 1000
+
+
+def answer_questions(questions, processes=1):
+    """
+    Answers every question, fanning them out across a pool of processes.
+    The processes are spawned rather than forked, as neither the database
+    client nor Spacy are safe to use in a forked process, and every process
+    loads its own models.
+    :return: a list of (answer, latency in milliseconds) in the same order
+    as the questions.
+    """
+    if processes <= 1:
+        _init_worker()
+        return [_answer_question(question) for question in questions]
+
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes, initializer=_init_worker) as pool:
+        # Small chunks keep the processes busy until the end, as the time
+        # spent on each question varies a lot.
+        return pool.map(_answer_question, questions, chunksize=4)
+
+
+def evaluate(tests, processes=1):
+    """
+    Evaluates the answers to every question in the tests.
+    :return: a dictionary with the precision of the texts and the urls,
+    the latency percentiles and the questions which were not answered
+    correctly.
+    """
+    questions = [(test, question) for test in tests
+                 for question in test["question"]]
+
+    start = time.perf_counter()
+    answers = answer_questions([question for test, question in questions],
+                               processes)
+    seconds = time.perf_counter() - start
+
+    score, url_score = 0, 0
+    failures = []
+    for (test, question), (answer, latency) in zip(questions, answers):
+        score_question, score_url = score_answer(test, answer)
+        score += score_question
+        url_score += score_url
+
+        if score_question < 1 or score_url == 0:
+            failures.append({"question": question, "answer": answer,
+                             "urls": test["urls"], "score": score_question,
+                             "url_score": score_url})
+
+    return {"questions": len(questions),
+            "text_precision": score / len(questions),
+            "url_precision": url_score / len(questions),
+            "latency_ms": get_latencies([latency
+                                         for answer, latency in answers]),
+            "processes": processes,
+            "seconds": seconds,
+            "failures": failures}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Evaluates the precision and latency of the answers.")
+    parser.add_argument("--tests", default=TESTS_FILE,
+                        help="JSON file with the questions and answers")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(),
+                        help="Processes answering questions, each with its "
+                             "own models")
+    parser.add_argument("--json", help="Write the results to this file, or "
+                                       "- for standard output")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Print the questions not answered correctly")
+    args = parser.parse_args()
+
+    results = evaluate(load_tests(args.tests), args.processes)
+
+    if args.verbose:
+        for failure in results["failures"]:
+            print("Question:\n", failure["question"])
+            print()
+            print("Gave:\n", failure["answer"])
+            print()
+            print("Correct URL was", failure["urls"])
+            print("\n\n\n\n")
 
-    print("Number of questions:", n_questions,
-          "score:", score,
-          "URLs correct:", url_score)
+    if args.json == "-":
+        print(json.dumps(results, indent=2))
+        return
+    elif args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
 
-    print("Text Precision:", score / n_questions)
-    print("URL Precision:", url_score / n_questions)
+    latencies = results["latency_ms"]
+    print("Number of questions:", results["questions"],
+          "processes:", results["processes"],
+          "seconds: {:.1f}".format(results["seconds"]))
+    print("Text Precision:", results["text_precision"])
+    print("URL Precision:", results["url_precision"])
+    print("Latency p50: {:.2f} ms p95: {:.2f} ms p99: {:.2f} ms "
+          "max: {:.2f} ms".format(latencies["p50"], latencies["p95"],
+                                  latencies["p99"], latencies["max"]))
 
 
 if __name__ == '__main__':
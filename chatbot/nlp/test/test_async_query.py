@@ -0,0 +1,36 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+from chatbot.nlp import async_query
+from chatbot.nlp.async_query import AsyncQueryHandler
+
+
+def _crash_process(barrier, timeout):
+    ''' Stands in for _init_process in a process which crashes while loading
+    the models. '''
+    os._exit(1)
+
+
+def test_init_process_timeout(monkeypatch):
+    monkeypatch.setattr(async_query, 'load_models', lambda: None)
+
+    # The other process never reaches the barrier.
+    barrier = threading.Barrier(2)
+    with pytest.raises(RuntimeError):
+        async_query._init_process(barrier, 0.01)
+    assert barrier.broken
+
+
+def test_start_crashed_process(monkeypatch):
+    monkeypatch.setattr(async_query, '_init_process', _crash_process)
+
+    handler = AsyncQueryHandler(processes=2, startup_timeout=1)
+    try:
+        with pytest.raises(RuntimeError):
+            asyncio.run(handler.start())
+        assert handler.executor is None
+    finally:
+        asyncio.run(handler.stop())
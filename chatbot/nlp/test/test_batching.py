@@ -0,0 +1,73 @@
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from chatbot.nlp.batching import BatchScheduler
+
+
+def test_batch_scheduler_idle():
+    batches = []
+
+    def double(items):
+        batches.append(items)
+        return [item * 2 for item in items]
+
+    # A request arriving when nothing else is answered does not wait for
+    # the window.
+    scheduler = BatchScheduler(double, 32, 10)
+    start = time.monotonic()
+    assert scheduler.submit(2) == 4
+    assert scheduler.submit(3) == 6
+    assert time.monotonic() - start < 1
+    assert batches == [[2], [3]]
+
+
+def test_batch_scheduler_concurrent():
+    batches = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def double(items):
+        batches.append(items)
+        started.set()
+        # Hold the first batch until every other item is queued.
+        release.wait()
+        return [item * 2 for item in items]
+
+    scheduler = BatchScheduler(double, 8, 0.001)
+    with ThreadPoolExecutor(max_workers=21) as executor:
+        first = executor.submit(scheduler.submit, -1)
+        started.wait()
+
+        futures = [executor.submit(scheduler.submit, i) for i in range(20)]
+        while len(scheduler.pending) < 20:
+            time.sleep(0.001)
+        release.set()
+
+        assert first.result() == -2
+        assert [future.result() for future in futures] == \
+            [i * 2 for i in range(20)]
+
+    # The queued items are answered in full batches.
+    assert batches[0] == [-1]
+    assert [len(batch) for batch in batches[1:]] == [8, 8, 4]
+    assert sorted(sum(batches[1:], [])) == list(range(20))
+
+
+def test_batch_scheduler_error():
+    def parse(items):
+        return [int(item) for item in items]
+
+    scheduler = BatchScheduler(parse, 8, 0.001)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(scheduler.submit, item)
+                   for item in ['1', 'x', '3', '4']]
+
+        # Only the bad item fails, even if it was in a batch with others.
+        assert futures[0].result() == 1
+        with pytest.raises(ValueError):
+            futures[1].result()
+        assert [future.result() for future in futures[2:]] == [3, 4]
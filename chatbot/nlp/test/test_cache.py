@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from chatbot.nlp.cache import (ResponseCache, get_content_version,
+                               invalidate_responses, normalize_query)
+
+
+def test_normalize_query():
+    assert normalize_query('  Åpningstider\n bolig ') == 'åpningstider bolig'
+
+
+def test_response_cache_get_set():
+    cache = ResponseCache.get_instance()
+    invalidate_responses()
+    key = ResponseCache.get_key('test query', 'plain')
+
+    hits, misses = cache.hits, cache.misses
+    assert cache.get(key) is None
+    cache.set(key, 'test response', get_content_version())
+    assert cache.get(ResponseCache.get_key('Test  query', 'plain')) == \
+        'test response'
+
+    assert cache.hits == hits + 1
+    assert cache.misses == misses + 1
+
+
+def test_response_cache_url_style():
+    cache = ResponseCache.get_instance()
+    invalidate_responses()
+    key = ResponseCache.get_key('test query', 'plain')
+
+    assert cache.get(key) is None
+    cache.set(key, 'test response', get_content_version())
+    assert cache.get(ResponseCache.get_key('test query', 'html')) is None
+    assert cache.get(key) == 'test response'
+
+
+def test_response_cache_set_after_invalidation():
+    cache = ResponseCache.get_instance()
+    invalidate_responses()
+    key = ResponseCache.get_key('test query', 'plain')
+
+    version = get_content_version()
+    assert cache.get(key) is None
+    invalidate_responses()
+    cache.set(key, 'stale response', version)
+    assert cache.get(key) is None
+
+
+def test_response_cache_set_after_other_lookup():
+    cache = ResponseCache.get_instance()
+    invalidate_responses()
+    key = ResponseCache.get_key('test query', 'plain')
+
+    version = get_content_version()
+    assert cache.get(key) is None
+    invalidate_responses()
+
+    # Another thread looks up a query after the invalidation, moving the
+    # cache to the new version before the stale response is stored.
+    assert cache.get(ResponseCache.get_key('other query', 'plain')) is None
+    cache.set(key, 'stale response', version)
+    assert cache.get(key) is None
+
+
+def test_response_cache_eviction():
+    cache = ResponseCache.get_instance()
+    invalidate_responses()
+    assert cache.get('0') is None
+
+    for i in range(cache.max_size + 1):
+        cache.set(str(i), i, get_content_version())
+
+    assert '0' not in cache.entries
+    assert cache.get(str(cache.max_size)) == cache.max_size
+
+
+def test_response_cache_invalidation():
+    cache = ResponseCache.get_instance()
+    cache.set('test key', 'test response', get_content_version())
+
+    invalidate_responses()
+    assert cache.get('test key') is None
+
+
+def test_response_cache_threads():
+    cache = ResponseCache.get_instance()
+    invalidate_responses()
+    assert cache.get('0') is None
+
+    hits, misses = cache.hits, cache.misses
+
+    def work(thread):
+        for i in range(1000):
+            key = str((thread + i) % 50)
+            if cache.get(key) is None:
+                cache.set(key, key, get_content_version())
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(work, range(8)))
+
+    # Every lookup was counted once, and no entry was lost or mixed up.
+    assert cache.hits + cache.misses == hits + misses + 8000
+    assert all(cache.get(str(i)) == str(i) for i in range(50))
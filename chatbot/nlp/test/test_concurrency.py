@@ -0,0 +1,54 @@
+import random
+
+from concurrent.futures import ThreadPoolExecutor
+
+from chatbot.nlp.cache import invalidate_responses
+from chatbot.nlp.query import QueryHandler, _perform_search
+from chatbot.nlp.test.evaluation import load_tests
+
+
+THREADS = 8
+
+# Every question is asked this many times, by different threads.
+REPEATS = 5
+
+
+def get_questions():
+    return [question for test in load_tests() for question in test['question']]
+
+
+def test_concurrent_searches():
+    questions = get_questions()
+    expected = {question: _perform_search(question, 'plain')
+                for question in questions}
+
+    asked = questions * REPEATS
+    random.Random(0).shuffle(asked)
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        answers = list(executor.map(
+            lambda question: _perform_search(question, 'plain'), asked))
+
+    for question, answer in zip(asked, answers):
+        assert answer == expected[question]
+
+
+def test_concurrent_responses():
+    handler = QueryHandler()
+    questions = get_questions()
+    expected = {question: _perform_search(question, 'html')
+                for question in questions}
+
+    # Start without cached responses, so that threads both compute and
+    # cache the responses to the same questions.
+    invalidate_responses()
+
+    asked = questions * REPEATS
+    random.Random(1).shuffle(asked)
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        answers = list(executor.map(
+            lambda question: handler.get_response(question, 'html'), asked))
+
+    for question, answer in zip(asked, answers):
+        assert answer == expected[question]
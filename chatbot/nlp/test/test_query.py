@@ -0,0 +1,21 @@
+from chatbot.nlp.query import _rank, ANSWER_THRESHOLD, MAX_ANSWERS
+
+
+def test_rank_ties():
+    # Documents with the same score are all part of the answer, in order.
+    ranked = _rank([0.5, 0.2, 0.5])
+    assert [position for position, score in ranked] == [0, 2]
+
+
+def test_rank_threshold():
+    assert _rank([ANSWER_THRESHOLD / 2] * 3) == []
+    assert _rank([]) == []
+
+
+def test_rank_many_candidates():
+    scores = [0.3] * 5000
+    scores[4321] = 0.35
+
+    ranked = _rank(scores)
+    assert ranked[0] == (4321, 0.35)
+    assert len(ranked) <= max(MAX_ANSWERS, 2)
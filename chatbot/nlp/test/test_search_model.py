@@ -0,0 +1,115 @@
+import os
+
+from chatbot.nlp.search_model import SearchModel, build_search_model
+
+
+docs = [
+    {'id': 'doc_1', 'content': {'title': 'Husleie',
+                                'text': 'Husleien betales hver måned.',
+                                'keywords': [{'keyword': 'faktura',
+                                              'confidence': 0.5}]}},
+    {'id': 'doc_2', 'content': {'title': 'Nøkler',
+                                'text': 'Mistet nøkkel kan bestilles.',
+                                'keywords': []}},
+]
+
+changed = {'id': 'doc_1', 'content': {'title': 'Nøkler',
+                                      'text': 'Mistet nøkkel.',
+                                      'keywords': []}}
+
+
+def test_search_model_rows():
+    model = SearchModel.build(docs)
+    assert model.get_rows(docs[::-1]) == [1, 0]
+
+
+def test_search_model_changed_document():
+    model = SearchModel.build(docs)
+    assert model.get_rows([changed]) == [None]
+
+
+def test_search_model_score():
+    model = SearchModel.build(docs)
+
+    scores = model.score(['nøkkel', 'husleie'], [docs + [changed], docs])
+    assert scores[0][1] > scores[0][0]
+    assert scores[0][2] > 0
+    assert scores[1][0] > scores[1][1]
+
+
+def test_search_model_search():
+    model = SearchModel.build(docs, ['prod', 'manual'])
+
+    rows_list, scores_list = model.search(['nøkkel', 'faktura', 'ukjent'])
+    assert rows_list == [[1], [0], []]
+    assert scores_list[0][0] > 0
+
+    # Keywords are only part of the inverted index, not the TF-IDF model.
+    assert list(scores_list[1]) == [0]
+
+
+def test_search_model_search_lsa():
+    model = SearchModel.build(docs, ['prod', 'manual'], lsa=True)
+    query = 'nøkkel husleie'
+
+    rows_list, scores_list = model.search([query], 'lsa')
+    assert rows_list[0] and set(rows_list[0]) <= {0, 1}
+    assert model.lsa_matrix.dtype == 'float32'
+
+    # The candidates are ranked by the same scores as in score.
+    candidates = [docs[row] for row in rows_list[0]]
+    assert list(scores_list[0]) == list(model.score([query],
+                                                    [candidates])[0])
+
+
+def test_search_model_without_lsa():
+    model = SearchModel.build(docs, ['prod', 'manual'])
+    assert model.svd is None
+
+    # Without the latent semantic space, the inverted index is used.
+    assert model.search(['nøkkel'], 'lsa')[0] == model.search(['nøkkel'])[0]
+
+
+def test_search_model_rebuild():
+    model = SearchModel.build(docs)
+    rebuilt = SearchModel.build([changed, docs[1]], previous=model)
+    fresh = SearchModel.build([changed, docs[1]])
+
+    assert rebuilt.terms == fresh.terms
+    assert (rebuilt.matrix != fresh.matrix).nnz == 0
+    assert (rebuilt.postings != fresh.postings).nnz == 0
+
+
+def test_search_model_save_load(tmpdir):
+    path = str(tmpdir.join('search_model.pickle'))
+    SearchModel.build(docs).save(path)
+
+    model = SearchModel.load(path)
+    assert model.ids == ['doc_1', 'doc_2']
+
+
+class EmptyFactory:
+    """ A model factory without any documents. """
+
+    def get_collection(self, collection):
+        return self
+
+    def find(self, *args):
+        return []
+
+
+def test_search_model_empty(tmpdir):
+    assert SearchModel.build([]) is None
+
+    # The model of documents which are gone is removed.
+    path = str(tmpdir.join('search_model.pickle'))
+    open(path, 'wb').close()
+    assert build_search_model(EmptyFactory(), path) is None
+    assert not os.path.exists(path)
+    assert build_search_model(EmptyFactory(), path) is None
+
+
+def test_search_model_no_terms():
+    empty = {'id': 'doc_empty', 'content': {'title': '', 'text': ' . ',
+                                            'keywords': []}}
+    assert SearchModel.build([empty]) is None
@@ -0,0 +1,45 @@
+import multiprocessing
+
+from chatbot.nlp.shared_cache import MmapCache
+
+
+def _set_in_other_process(path, key, value):
+    MmapCache(path, 16, 256).set(key, value, 1, 60)
+
+
+def test_mmap_cache_get_set(tmpdir):
+    cache = MmapCache(str(tmpdir.join('cache')), 16, 256)
+
+    assert cache.get('test query', 1) is None
+    cache.set('test query', 'test response', 1, 60)
+    assert cache.get('test query', 1) == 'test response'
+
+
+def test_mmap_cache_version(tmpdir):
+    cache = MmapCache(str(tmpdir.join('cache')), 16, 256)
+    cache.set('test query', 'test response', 1, 60)
+    assert cache.get('test query', 2) is None
+
+
+def test_mmap_cache_expired(tmpdir):
+    cache = MmapCache(str(tmpdir.join('cache')), 16, 256)
+    cache.set('test query', 'test response', 1, -1)
+    assert cache.get('test query', 1) is None
+
+
+def test_mmap_cache_too_large(tmpdir):
+    cache = MmapCache(str(tmpdir.join('cache')), 16, 256)
+    cache.set('test query', 'x' * 256, 1, 60)
+    assert cache.get('test query', 1) is None
+
+
+def test_mmap_cache_shared_between_processes(tmpdir):
+    path = str(tmpdir.join('cache'))
+    cache = MmapCache(path, 16, 256)
+
+    process = multiprocessing.Process(target=_set_in_other_process,
+                                      args=(path, 'test query', 'response'))
+    process.start()
+    process.join()
+
+    assert cache.get('test query', 1) == 'response'
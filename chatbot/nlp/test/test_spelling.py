@@ -0,0 +1,49 @@
+import pytest
+
+from spellchecker import SpellChecker
+
+from chatbot.nlp.spelling import SpellingCorrector, damerau_levenshtein
+
+
+words = ['Hei', 'kontakt', 'åpningstidr', 'boligadminstrasjonen', 'husleia',
+         'nøkel', 'betlae', 'telefonummer', 'søkand', 'startlna', 'xq', '12',
+         'a1', 'ungdomsbloig', 'purregebry', 'hvordn', 'brannslukker']
+
+
+def test_spelling_corrector_singleton_constructor():
+    SpellingCorrector.get_instance()
+    with pytest.raises(Exception):
+        assert SpellingCorrector()
+
+
+def test_damerau_levenshtein():
+    assert damerau_levenshtein('kontakt', 'kontakt') == 0
+    assert damerau_levenshtein('kontakt', 'kotnakt') == 1
+    assert damerau_levenshtein('ca', 'abc') == 2
+
+
+def test_spelling_corrections():
+    # The corrections should be the same as the ones given by pyspellchecker.
+    # Words with the same frequency are ordered arbitrarily by
+    # pyspellchecker, so we compare the probability of the corrections.
+    corrector = SpellingCorrector.get_instance()
+    spell = SpellChecker(local_dictionary='chatbot/nlp/statics/no_50k.json')
+
+    for word in words:
+        correction = corrector.correction(word)
+        expected = spell.correction(word)
+
+        assert (correction == expected or
+                spell.word_probability(correction) ==
+                spell.word_probability(expected))
+
+
+def test_spelling_no_correction():
+    # Words without a correction are returned as they were given, like
+    # pyspellchecker does, including their case.
+    corrector = SpellingCorrector.get_instance()
+
+    assert corrector.correction('Qzxqzx') == 'Qzxqzx'
+    assert corrector.correction('Boligadminstrasjonen') == \
+        'Boligadminstrasjonen'
+    assert corrector.correction('qzxqzx') == 'qzxqzx'
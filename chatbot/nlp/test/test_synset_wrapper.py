@@ -20,3 +20,15 @@ def test_get_synset_list():
     wrapper = SynsetWrapper.get_instance()
     synset = wrapper.get_synset('tlf')
     assert 'epost' in synset
+
+
+def test_get_synset_is_immutable():
+    wrapper = SynsetWrapper.get_instance()
+    synset = wrapper.get_synset('tlf')
+    assert isinstance(synset, frozenset)
+    assert wrapper.get_synset('tlf') is synset
+
+
+def test_get_synset_unknown_token():
+    wrapper = SynsetWrapper.get_instance()
+    assert wrapper.get_synset('sakfscfdsojimad') is None
@@ -0,0 +1,35 @@
+import numpy as np
+
+from chatbot.nlp.test.threshold_sweep import sweep
+
+
+def test_sweep():
+    # One question where the second best candidate has the correct answer,
+    # and one question without candidates.
+    cache = [{'question': 'a',
+              'scores': np.array([0.5, 0.45, 0.1]),
+              'text_scores': np.array([0.0, 1.0, 0.0]),
+              'url_scores': np.array([0.0, 1.0, 1.0]),
+              'lengths': np.array([100, 100, 100]),
+              'not_found': (0, 0)},
+             {'question': 'b',
+              'scores': np.zeros(0),
+              'text_scores': np.zeros(0),
+              'url_scores': np.zeros(0),
+              'lengths': np.zeros(0, dtype=int),
+              'not_found': (0, 0)}]
+
+    results = sweep(cache, [0.1, 0.6], [0.01, 0.1], [150, 50], [1, 3])
+    results = {point[:4]: point[4:] for point in results}
+    assert len(results) == 16
+
+    # Both of the best candidates are shown.
+    assert results[(0.1, 0.1, 150, 3)] == (0.5, 0.5)
+    # Only the best candidate is within the similarity threshold.
+    assert results[(0.1, 0.01, 150, 3)] == (0.0, 0.0)
+    # The first answer reaches the character limit.
+    assert results[(0.1, 0.1, 50, 3)] == (0.0, 0.0)
+    # Only one answer is ever shown.
+    assert results[(0.1, 0.1, 150, 1)] == (0.0, 0.0)
+    # No candidate passes the answer threshold.
+    assert results[(0.6, 0.1, 150, 3)] == (0.0, 0.0)
@@ -0,0 +1,45 @@
+from chatbot.model.model_factory import ModelFactory
+from chatbot.nlp.query import QueryHandler
+from chatbot.nlp.unknown_queries import UnknownQueryRecorder, UNKNOWN_COL
+
+
+factory = ModelFactory.get_instance()
+factory.set_db()
+
+
+def test_record_unknown_queries():
+    query = 'test recorded unknown query'
+    recorder = UnknownQueryRecorder.get_instance()
+
+    try:
+        recorder.record(query)
+        recorder.record(query)
+        recorder.flush()
+        recorder.record(query)
+        recorder.flush()
+
+        docs = list(factory.get_collection(UNKNOWN_COL)
+                    .find({'query_text': query}))
+        assert len(docs) == 1
+        assert docs[0]['count'] == 3
+        assert docs[0]['first_seen'] <= docs[0]['last_seen']
+    finally:
+        factory.delete_document({'query_text': query}, UNKNOWN_COL)
+
+
+def test_record_repeated_unknown_queries():
+    query = 'test repeated unknown query'
+    recorder = UnknownQueryRecorder.get_instance()
+
+    try:
+        # A query asked twice in a batch counts twice, although it is only
+        # answered once.
+        QueryHandler().get_responses([query, query])
+        recorder.flush()
+
+        docs = list(factory.get_collection(UNKNOWN_COL)
+                    .find({'query_text': query}))
+        assert len(docs) == 1
+        assert docs[0]['count'] == 2
+    finally:
+        factory.delete_document({'query_text': query}, UNKNOWN_COL)
@@ -0,0 +1,27 @@
+from chatbot.nlp.wordnet_table import WordNetTable, load_wordnet
+
+
+wn = load_wordnet()
+
+
+def _wordnet_synonyms(lemma, name):
+    # The expansion the query system used to do using NLTK directly.
+    synsets = wn.synsets(lemma, lang='nob', pos=getattr(wn, name, None))
+    if not synsets:
+        return None
+    return set(name.replace('_', ' ') for synset in synsets
+               for name in synset.lemma_names(lang='nob'))
+
+
+def test_wordnet_table_synonyms():
+    table = WordNetTable.get_instance()
+    lemmas = ['bil', 'hus', 'bolig', 'leie', 'betale', 'nøkkel', 'Skole',
+              'sakfscfdsojimad']
+
+    for lemma in lemmas:
+        for name in ['bil', 'NOUN', 'VERB', 'ADJ', 'synsets']:
+            synonyms = table.get_synonyms(lemma, table.get_pos(name))
+            expected = _wordnet_synonyms(lemma, name)
+
+            assert (synonyms if synonyms is None else set(synonyms)) == \
+                expected
@@ -0,0 +1,200 @@
+import argparse
+import itertools
+import json
+import os
+import pickle
+
+import numpy as np
+
+from chatbot.nlp.cache import get_content_version
+from chatbot.nlp.query import ANSWER_THRESHOLD, CHAR_LIMIT, MAX_ANSWERS, \
+    NOT_FOUND, RETRIEVAL_ENGINE, SIMILARITY_THRESHOLD, _format_answer, \
+    _get_answer, get_candidates
+from chatbot.nlp.test.evaluation import TESTS_FILE, load_tests, score_answer
+
+
+CACHE_FILE = 'logs/threshold_sweep_cache.pkl'
+
+# Questions are expanded and scored in batches of this size.
+BATCH_SIZE = 64
+
+# The default grid of settings to evaluate.
+ANSWER_THRESHOLDS = np.round(np.arange(0.0, 0.31, 0.01), 2).tolist()
+SIMILARITY_THRESHOLDS = np.round(np.arange(0.0, 0.31, 0.01), 2).tolist()
+CHARACTER_LIMITS = [100, 200, 300, 400, 600, 800, 1000]
+MAX_ANSWERS_VALUES = [1, 2, 3, 4, 5]
+
+
+def _get_candidate(test, doc):
+    """ Scores the answer a single candidate document would give, and
+    returns its length as counted against the character limit. """
+    answer = _get_answer(doc)
+    # Formatting replaces the text of the answer, and the limit is counted
+    # on the text before it is formatted.
+    length = len(answer[0])
+    score, url_score = score_answer(test, _format_answer(answer, 'plain'))
+    return score, url_score, length
+
+
+def build_cache(tests, engine=RETRIEVAL_ENGINE):
+    """
+    Retrieves and scores the candidates of every question once.
+    :return: for each question, the candidate scores sorted best first,
+    the text and url score of the answer of each candidate, the length of
+    each answer, and the text and url score of the not found answer.
+    """
+    questions = [(test, question) for test in tests
+                 for question in test['question']]
+
+    cache = []
+    for start in range(0, len(questions), BATCH_SIZE):
+        batch = questions[start:start + BATCH_SIZE]
+        results = get_candidates([question for test, question in batch],
+                                 engine)
+
+        for (test, question), (docs, scores) in zip(batch, results):
+            if scores is None:
+                # Candidates which could not be scored are never answers.
+                docs, scores = [], np.zeros(0)
+
+            # The same order as the ranking, ties ordered by position.
+            order = np.argsort(-np.asarray(scores), kind='stable')
+            candidates = [_get_candidate(test, docs[i]) for i in order]
+
+            cache.append({
+                'question': question,
+                'scores': np.asarray(scores, dtype=np.float64)[order],
+                'text_scores': np.array([c[0] for c in candidates],
+                                        dtype=np.float64),
+                'url_scores': np.array([c[1] for c in candidates],
+                                       dtype=np.float64),
+                'lengths': np.array([c[2] for c in candidates]),
+                'not_found': score_answer(test, NOT_FOUND)
+            })
+
+    return cache
+
+
+def load_cache(tests_file, engine, path=CACHE_FILE, refresh=False):
+    """ Loads the cached candidates, building them again if the content, the
+    questions or the engine changed since they were cached. """
+    key = (tests_file, os.stat(tests_file).st_mtime_ns, engine,
+           get_content_version())
+
+    if not refresh and os.path.isfile(path):
+        with open(path, 'rb') as f:
+            cached_key, cache = pickle.load(f)
+        if cached_key == key:
+            return cache
+
+    cache = build_cache(load_tests(tests_file), engine)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as f:
+        pickle.dump((key, cache), f)
+
+    return cache
+
+
+def sweep(cache, answer_thresholds, similarity_thresholds, character_limits,
+          max_answers_values):
+    """
+    Evaluates every combination of settings on the cached candidates,
+    following the same rules as _rank and _get_response. The settings are
+    vectorized, so each question is only visited once.
+    :return: a list of (answer threshold, similarity threshold, character
+    limit, max answers, text precision, url precision) tuples.
+    """
+    grid = list(itertools.product(answer_thresholds, similarity_thresholds,
+                                  character_limits, max_answers_values))
+    answer_threshold, similarity_threshold, character_limit, max_answers = \
+        (np.array(values) for values in zip(*grid))
+
+    text_total = np.zeros(len(grid))
+    url_total = np.zeros(len(grid))
+
+    for question in cache:
+        scores = question['scores']
+        not_found_text, not_found_url = question['not_found']
+        if not scores.size:
+            text_total += not_found_text
+            url_total += not_found_url
+            continue
+
+        # Candidates within the similarity threshold of the best one,
+        # which is a prefix as the scores are sorted.
+        selected = np.searchsorted(scores[0] - scores, similarity_threshold,
+                                   side='right')
+        selected = np.minimum(selected, np.maximum(max_answers, 2))
+        found = (scores[0] >= answer_threshold) & (selected > 0)
+
+        # Answers are added until they reach the character limit.
+        lengths = np.cumsum(question['lengths'])
+        added = np.searchsorted(lengths, character_limit, side='left') + 1
+        added = np.minimum(added, selected)
+        shown = np.where((selected <= 1) | (added <= 1), 1,
+                         np.minimum(added, max_answers))
+
+        # The response is correct if any of the answers shown is.
+        best_text = np.maximum.accumulate(question['text_scores'])
+        best_url = np.maximum.accumulate(question['url_scores'])
+        text_total += np.where(found, best_text[shown - 1], not_found_text)
+        url_total += np.where(found, best_url[shown - 1], not_found_url)
+
+    return [point + (text / len(cache), url / len(cache))
+            for point, text, url in zip(grid, text_total, url_total)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Evaluates a grid of thresholds on candidates which are '
+                    'retrieved and scored once.')
+    parser.add_argument('--tests', default=TESTS_FILE)
+    parser.add_argument('--engine', default=RETRIEVAL_ENGINE,
+                        choices=('mongo', 'bm25', 'lsa'))
+    parser.add_argument('--refresh', action='store_true',
+                        help='Retrieve the candidates again')
+    parser.add_argument('--answer-thresholds', type=float, nargs='+',
+                        default=ANSWER_THRESHOLDS)
+    parser.add_argument('--similarity-thresholds', type=float, nargs='+',
+                        default=SIMILARITY_THRESHOLDS)
+    parser.add_argument('--character-limits', type=int, nargs='+',
+                        default=CHARACTER_LIMITS)
+    parser.add_argument('--max-answers', type=int, nargs='+',
+                        default=MAX_ANSWERS_VALUES)
+    parser.add_argument('--top', type=int, default=10,
+                        help='Number of best settings to print')
+    parser.add_argument('--json', help='Write every point to this file')
+    args = parser.parse_args()
+
+    if min(args.max_answers) < 1:
+        parser.error('At least one answer must be shown')
+
+    cache = load_cache(args.tests, args.engine, refresh=args.refresh)
+    results = sweep(cache, args.answer_thresholds, args.similarity_thresholds,
+                    args.character_limits, args.max_answers)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump([dict(zip(('answer_threshold', 'similarity_threshold',
+                                 'character_limit', 'max_answers',
+                                 'text_precision', 'url_precision'), point))
+                       for point in results], f, indent=2)
+
+    current = sweep(cache, [ANSWER_THRESHOLD], [SIMILARITY_THRESHOLD],
+                    [CHAR_LIMIT], [MAX_ANSWERS])
+    best = sorted(results, key=lambda point: (-point[4], -point[5]))
+
+    print('{} questions, {} settings'.format(len(cache), len(results)))
+    print('{:<10}{:>8}{:>8}{:>8}{:>8}{:>8}{:>8}'.format(
+        '', 'Answer', 'Simil.', 'Chars', 'Max', 'Text', 'URL'))
+    for label, point in [('Current', current[0])] + \
+            [('Best', point) for point in best[:args.top]]:
+        print('{:<10}{:>8.3f}{:>8.3f}{:>8}{:>8}{:>8.3f}{:>8.3f}'
+              .format(label, *point))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+import atexit
+import datetime
+import logging
+import os
+import threading
+
+import pymongo
+
+from chatbot.model.model_factory import ModelFactory
+from chatbot.util.config_util import Config
+
+
+UNKNOWN_COL = Config.get_mongo_collection('unknown')
+FLUSH_INTERVAL = Config.get_value(['query_system', 'unknown_queries',
+                                   'flush_interval'])
+MAX_PENDING = Config.get_value(['query_system', 'unknown_queries',
+                                'max_pending'])
+
+
+def ensure_indexes(collection):
+    ''' Creates the indexes of the unknown queries collection. Each query is
+    stored once, and the most frequent queries can be listed using the index
+    on the count. '''
+    collection.create_index([('query_text', pymongo.ASCENDING)], unique=True)
+    collection.create_index([('count', pymongo.DESCENDING)])
+
+
+class UnknownQueryRecorder():
+    ''' Records the queries the query system could not answer. The queries
+    are queued in memory and written to MongoDB in bulk by a background
+    thread, so that recording a query never blocks a response. Each query is
+    stored once, together with how many times it has been asked and when it
+    was first and last asked. '''
+    __instance = None
+    __lock = threading.Lock()
+
+    @staticmethod
+    def get_instance():
+        ''' Static access method '''
+        if UnknownQueryRecorder.__instance is None:
+            with UnknownQueryRecorder.__lock:
+                if UnknownQueryRecorder.__instance is None:
+                    UnknownQueryRecorder()
+        return UnknownQueryRecorder.__instance
+
+    def __init__(self):
+        ''' Virtually private constructor '''
+        if UnknownQueryRecorder.__instance is not None:
+            raise Exception('This class is a singleton!')
+        else:
+            self.interval = FLUSH_INTERVAL
+            self.max_pending = MAX_PENDING
+            self.lock = threading.Lock()
+            self.wake = threading.Event()
+            # Maps each query to [count, first seen, last seen].
+            self.pending = {}
+            self.pid = None
+            self.indexed = False
+            atexit.register(self.flush)
+            UnknownQueryRecorder.__instance = self
+
+    def __start(self):
+        ''' Starts the background thread. This is done once in each process,
+        as threads do not survive a fork. Queries queued by the parent
+        process are left for the parent to write. '''
+        if self.pid == os.getpid():
+            return
+
+        self.pid = os.getpid()
+        self.pending = {}
+        threading.Thread(target=self.__run, name='unknown-query-recorder',
+                         daemon=True).start()
+
+    def __run(self):
+        while True:
+            # Flush regularly, or as soon as many queries are pending.
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            self.flush()
+
+    def record(self, query_text):
+        ''' Queues a query which could not be answered. '''
+        now = datetime.datetime.utcnow()
+
+        with self.lock:
+            self.__start()
+
+            entry = self.pending.get(query_text)
+            if entry:
+                entry[0] += 1
+                entry[2] = now
+            else:
+                self.pending[query_text] = [1, now, now]
+
+            full = len(self.pending) >= self.max_pending
+
+        if full:
+            self.wake.set()
+
+    def flush(self):
+        ''' Writes the queued queries to MongoDB. '''
+        with self.lock:
+            pending, self.pending = self.pending, {}
+
+        if not pending:
+            return
+
+        collection = ModelFactory.get_instance().get_collection(UNKNOWN_COL)
+
+        try:
+            if not self.indexed:
+                # Make sure the query text is unique, in case launch.py has
+                # not been run yet.
+                self.indexed = True
+                ensure_indexes(collection)
+        except pymongo.errors.PyMongoError as e:
+            logging.warning('Could not index unknown queries: {}'.format(e))
+
+        requests = [
+            pymongo.UpdateOne({'query_text': query_text},
+                              {'$inc': {'count': count},
+                               '$min': {'first_seen': first_seen},
+                               '$max': {'last_seen': last_seen}},
+                              upsert=True)
+            for query_text, (count, first_seen, last_seen) in pending.items()
+        ]
+
+        try:
+            collection.bulk_write(requests, ordered=False)
+        except pymongo.errors.PyMongoError as e:
+            logging.error('Could not record {} unknown queries: {}'
+                          .format(len(requests), e))
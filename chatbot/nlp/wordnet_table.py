@@ -0,0 +1,196 @@
+import argparse
+import mmap
+import os
+import threading
+
+from chatbot.util.config_util import Config
+
+
+WORDNET_TABLE_FILE = Config.get_value(['query_system', 'wordnet_table_file'])
+
+# Directory of the NLTK corpora, which are downloaded when the image is built
+# so that no network is needed afterwards.
+NLTK_DATA = Config.get_value(['nlp', 'nltk_data'])
+
+# The NLTK corpora the table is exported from.
+CORPORA = ['wordnet', 'omw']
+
+# How to build the table and download the corpora.
+BUILD_COMMAND = 'make wordnet-table'
+
+# Language of the lemmas in the Open Multilingual WordNet.
+LANGUAGE = 'nob'
+
+# The part-of-speech constants of the NLTK WordNet reader.
+WORDNET_POS = {'ADJ': 'a', 'ADJ_SAT': 's', 'ADV': 'r', 'NOUN': 'n',
+               'VERB': 'v'}
+
+# Key used for lookups without a part-of-speech.
+ANY_POS = '*'
+
+
+def load_wordnet(download=False):
+    ''' Returns the NLTK WordNet reader, using the corpora in NLTK_DATA. The
+    corpora missing from it are downloaded if download is set, and raise a
+    LookupError otherwise. '''
+    import nltk
+
+    if NLTK_DATA not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA)
+
+    for corpus in CORPORA:
+        try:
+            nltk.data.find('corpora/{}'.format(corpus))
+        except LookupError:
+            if not download:
+                raise LookupError(
+                    'The NLTK corpus {} is missing from {}, run "{}" to '
+                    'download it'.format(corpus, NLTK_DATA, BUILD_COMMAND))
+            nltk.download(corpus, download_dir=NLTK_DATA, quiet=True)
+
+    from nltk.corpus import wordnet
+    return wordnet
+
+
+def export_table(path=WORDNET_TABLE_FILE, download=False):
+    ''' Exports the synonyms of every Norwegian lemma in WordNet to a table
+    which can be searched without loading WordNet.
+
+    Each line of the table holds a lemma, a part-of-speech and the synonyms
+    for that combination, separated by tabs. The lines are sorted, so that
+    lookups can use a binary search directly on the memory mapped file. The
+    first line lists the attributes of the WordNet reader, as those are used
+    to look up the part-of-speech of a token.
+
+    Only run when the image is built, or explicitly with BUILD_COMMAND. The
+    corpora are only downloaded if download is set. '''
+    wn = load_wordnet(download)
+
+    lines = set()
+    for lemma in wn.all_lemma_names(lang=LANGUAGE):
+        for pos in [None] + sorted(set(WORDNET_POS.values())):
+            synsets = wn.synsets(lemma, lang=LANGUAGE, pos=pos)
+            if not synsets:
+                continue
+
+            # Some lemmas contain underscores, which we remove.
+            names = sorted(set(name.replace('_', ' ')
+                               for synset in synsets
+                               for name in synset.lemma_names(lang=LANGUAGE)))
+
+            lines.add('\t'.join([lemma.lower(), pos or ANY_POS,
+                                 '|'.join(names)]))
+
+    attributes = [name for name in dir(wn)
+                  if getattr(wn, name, None) is not None]
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # Sort on the encoded lines, as that is how they are compared when the
+    # table is searched.
+    lines = sorted(line.encode('utf-8') for line in lines)
+
+    with open(path, 'wb') as table_file:
+        table_file.write('|'.join(attributes).encode('utf-8') + b'\n')
+        for line in lines:
+            table_file.write(line + b'\n')
+
+
+class WordNetTable():
+    ''' Lookups in the table of Norwegian WordNet synonyms created by
+    export_table. The table is memory mapped, so it is never parsed and is
+    shared between all processes on a host.
+
+    The table is never built while serving requests, as that takes a while
+    and every worker would do it. It must be exported beforehand. '''
+    __instance = None
+    __lock = threading.Lock()
+
+    @staticmethod
+    def get_instance():
+        ''' Static access method '''
+        if WordNetTable.__instance is None:
+            with WordNetTable.__lock:
+                if WordNetTable.__instance is None:
+                    WordNetTable()
+        return WordNetTable.__instance
+
+    def __init__(self):
+        ''' Virtually private constructor '''
+        if WordNetTable.__instance is not None:
+            raise Exception('This class is a singleton!')
+        else:
+            if not os.path.exists(WORDNET_TABLE_FILE):
+                raise FileNotFoundError(
+                    'The WordNet table {} is missing, run "{}" to export it'
+                    .format(WORDNET_TABLE_FILE, BUILD_COMMAND))
+
+            with open(WORDNET_TABLE_FILE, 'rb') as table_file:
+                self.table = mmap.mmap(table_file.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+
+            header_end = self.table.find(b'\n')
+            self.attributes = set(
+                self.table[:header_end].decode('utf-8').split('|'))
+            self.start = header_end + 1
+            WordNetTable.__instance = self
+
+    def get_pos(self, name):
+        ''' Returns the WordNet part-of-speech for the given name, the same
+        way as getattr(wordnet, name, None) would. Names of attributes which
+        are not a part-of-speech give False, as no synsets will match them.
+        '''
+        if name not in self.attributes:
+            return None
+        return WORDNET_POS.get(name, False)
+
+    def __find(self, key):
+        ''' Binary search for the line starting with key. Returns the rest of
+        the line, or None if no line starts with key. '''
+        low, high = self.start, len(self.table)
+
+        # Invariant: low is always at the start of a line.
+        while low < high:
+            middle = (low + high) // 2
+            start = max(self.table.rfind(b'\n', low, middle) + 1, low)
+            end = self.table.find(b'\n', start)
+
+            if self.table[start:end] < key:
+                low = end + 1
+            else:
+                high = start
+
+        end = self.table.find(b'\n', low)
+        line = self.table[low:end]
+        return line[len(key):] if line.startswith(key) else None
+
+    def get_synonyms(self, lemma, pos=None):
+        ''' Returns the synonyms of the lemma in all synsets with the given
+        part-of-speech, or None if WordNet has no synsets for them. '''
+        if pos is False:
+            return None
+
+        key = '\t'.join([lemma.lower(), pos or ANY_POS, ''])
+        synonyms = self.__find(key.encode('utf-8'))
+
+        if synonyms is None:
+            return None
+        return synonyms.decode('utf-8').split('|') if synonyms else []
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Exports the table of Norwegian WordNet synonyms used by '
+                    'the query system.')
+    parser.add_argument('--download', action='store_true',
+                        help='Download the NLTK corpora missing from {}'
+                             .format(NLTK_DATA))
+    args = parser.parse_args()
+
+    export_table(download=args.download)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+import subprocess
+import sys
+
+
+# Seconds a worker may spend importing the API server, in a fresh process.
+IMPORT_BUDGET = 3.0
+
+IMPORT_SERVER = '''
+import sys
+import time
+
+start = time.perf_counter()
+import chatbot.api.server
+seconds = time.perf_counter() - start
+
+from chatbot.nlp.keyword import nb
+print(seconds, nb.is_loaded(), 'spacy' in sys.modules)
+'''
+
+
+def test_server_import_time():
+    output = subprocess.check_output([sys.executable, '-c', IMPORT_SERVER])
+    seconds, model_loaded, spacy_imported = output.decode().split()[-3:]
+
+    # Models are loaded on first use, not when the server is imported.
+    assert model_loaded == 'False'
+    assert spacy_imported == 'False'
+    assert float(seconds) < IMPORT_BUDGET
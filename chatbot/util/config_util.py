@@ -1,14 +1,18 @@
 import json
 import os
+import threading
 
 
 class Config:
     __config = None
+    __lock = threading.Lock()
 
     @staticmethod
     def get_config():
         if Config.__config is None:
-            Config()
+            with Config.__lock:
+                if Config.__config is None:
+                    Config()
 
         return Config.__config
 
@@ -0,0 +1,16 @@
+import numpy as np
+
+
+def get_percentile(latencies, percent):
+    """ Returns the given percentile of a list of latencies. """
+    return float(np.percentile(latencies, percent))
+
+
+def get_latencies(latencies):
+    """ Summarizes a list of latencies in milliseconds. """
+    latencies = np.asarray(latencies)
+    return {'mean': float(latencies.mean()),
+            'p50': get_percentile(latencies, 50),
+            'p95': get_percentile(latencies, 95),
+            'p99': get_percentile(latencies, 99),
+            'max': float(latencies.max())}
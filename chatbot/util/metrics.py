@@ -0,0 +1,218 @@
+import bisect
+import collections
+import contextlib
+import os
+import threading
+import time
+
+
+# Upper bounds of the latency buckets, in seconds.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """ Counts observed values in fixed buckets, like a Prometheus
+    histogram. """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # The last count is for values above the largest bucket.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def get_cumulative_counts(self):
+        """ Returns (upper bound, count) for every bucket, where each count
+        includes the values in all lower buckets. """
+        bounds = [str(bucket) for bucket in self.buckets] + ['+Inf']
+        cumulative, total = [], 0
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+
+class Metrics:
+    """ Latency histograms for each stage of the query pipeline, and request
+    counts for each source. The metrics are kept per worker process. """
+    __instance = None
+    __lock = threading.Lock()
+
+    @staticmethod
+    def get_instance():
+        """ Static access method. """
+        if Metrics.__instance is None:
+            with Metrics.__lock:
+                if Metrics.__instance is None:
+                    Metrics()
+        return Metrics.__instance
+
+    def __init__(self):
+        """ Virtually private constructor. """
+        if Metrics.__instance is not None:
+            raise Exception("This class is a singleton!")
+        else:
+            self.lock = threading.Lock()
+            self.stages = collections.OrderedDict()
+            self.requests = collections.Counter()
+            Metrics.__instance = self
+
+    def observe(self, stage, seconds):
+        """ Records the time spent in a stage. """
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def count_request(self, source, n=1):
+        """ Counts requests from a source, e.g. the web page or Dialogflow. """
+        with self.lock:
+            self.requests[source] += n
+
+    def render(self, cache_stats=None):
+        """ Renders the metrics in the Prometheus text format. The process id
+        is added as a label, as every worker keeps its own metrics. """
+        worker = os.getpid()
+        lines = []
+
+        with self.lock:
+            lines += ['# HELP chatbot_stage_seconds Time spent in each stage '
+                      'of the query pipeline.',
+                      '# TYPE chatbot_stage_seconds histogram']
+            for stage, histogram in self.stages.items():
+                labels = 'worker="{}",stage="{}"'.format(worker, stage)
+                for bound, count in histogram.get_cumulative_counts():
+                    lines.append('chatbot_stage_seconds_bucket{{{},le="{}"}} '
+                                 '{}'.format(labels, bound, count))
+                lines.append('chatbot_stage_seconds_sum{{{}}} {}'
+                             .format(labels, histogram.sum))
+                lines.append('chatbot_stage_seconds_count{{{}}} {}'
+                             .format(labels, histogram.count))
+
+            lines += ['# HELP chatbot_requests_total Queries answered, per '
+                      'source.',
+                      '# TYPE chatbot_requests_total counter']
+            for source, count in self.requests.items():
+                lines.append('chatbot_requests_total{{worker="{}",'
+                             'source="{}"}} {}'.format(worker, source, count))
+
+        if cache_stats is not None:
+            lookups = cache_stats['hits'] + cache_stats['misses']
+            ratio = cache_stats['hits'] / lookups if lookups else 0.0
+            for name, kind, value in [
+                    ('response_cache_hits_total', 'counter',
+                     cache_stats['hits']),
+                    ('response_cache_shared_hits_total', 'counter',
+                     cache_stats['shared_hits']),
+                    ('response_cache_misses_total', 'counter',
+                     cache_stats['misses']),
+                    ('response_cache_entries', 'gauge', cache_stats['size']),
+                    ('response_cache_hit_ratio', 'gauge', ratio)]:
+                lines.append('# TYPE chatbot_{} {}'.format(name, kind))
+                lines.append('chatbot_{}{{worker="{}"}} {}'
+                             .format(name, worker, value))
+
+        return '\n'.join(lines) + '\n'
+
+
+class Trace:
+    """ The stage timings and other details of a single request. A detailed
+    trace also collects details which are too costly to collect for every
+    request. The stages of a request which is not observed, such as an
+    explanation, are only added to its trace and not to the metrics. """
+
+    def __init__(self, detailed=False, observed=True):
+        self.stages = collections.OrderedDict()
+        self.details = {}
+        self.detailed = detailed
+        self.observed = observed
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+
+# The trace of the request handled by the current thread, if any.
+_local = threading.local()
+
+
+def get_trace():
+    """ Returns the trace of the current request, or None if it is not
+    traced. """
+    return getattr(_local, 'trace', None)
+
+
+def is_detailed():
+    """ Returns True if the current request has a detailed trace. """
+    trace = get_trace()
+    return trace is not None and trace.detailed
+
+
+@contextlib.contextmanager
+def traced(enabled=True, detailed=False, observed=True):
+    """ Traces the request handled in the block, yielding the trace. Yields
+    None if tracing is not enabled. """
+    if not enabled:
+        yield None
+        return
+
+    previous = get_trace()
+    _local.trace = Trace(detailed, observed)
+    try:
+        yield _local.trace
+    finally:
+        _local.trace = previous
+
+
+def annotate(key, value):
+    """ Adds a detail to the trace of the current request, if traced. """
+    trace = get_trace()
+    if trace is not None:
+        trace.details[key] = value
+
+
+def annotate_detail(key, value):
+    """ Appends a detail to a list in the trace of the current request, if it
+    has a detailed trace. Queries in a batch append one value each. """
+    if is_detailed():
+        get_trace().details.setdefault(key, []).append(value)
+
+
+def split_trace(trace, traces):
+    """ Adds the trace of a batch to the traces of the requests in it, in
+    the same order, with None for the requests which are not traced. Every
+    request waited for the whole batch, so each of them gets all its stages,
+    but only its own value of each detail, as the details of a batch are
+    lists with a value for each request. """
+    for i, request_trace in enumerate(traces):
+        if request_trace is None:
+            continue
+
+        for stage, seconds in trace.stages.items():
+            request_trace.add(stage, seconds)
+        for key, values in trace.details.items():
+            request_trace.details.setdefault(key, []).append(values[i])
+
+
+@contextlib.contextmanager
+def timed(stage):
+    """ Measures the time spent in the block as the given stage, and adds it
+    to the trace of the current request, and to the metrics unless the
+    request is not observed. """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+
+        trace = get_trace()
+        if trace is None or trace.observed:
+            Metrics.get_instance().observe(stage, seconds)
+        if trace is not None:
+            trace.add(stage, seconds)
@@ -0,0 +1,88 @@
+import datetime
+import json
+import logging
+import os
+import random
+import threading
+
+from logging.handlers import RotatingFileHandler
+
+from chatbot.util.config_util import Config
+
+
+SLOW_QUERY_LOG = Config.get_value(['query_system', 'slow_query_log'])
+
+# Requests taking longer than this many seconds are logged.
+BUDGET = SLOW_QUERY_LOG['budget_ms'] / 1000
+
+
+_logger = None
+_logger_pid = None
+_logger_lock = threading.Lock()
+
+
+def get_path(pid=None):
+    """ Returns the slow query log of a worker process. Every worker writes
+    to a file of its own, as rotating a file shared by several processes
+    loses or overwrites records. """
+    root, extension = os.path.splitext(SLOW_QUERY_LOG['file'])
+    return '{}.{}{}'.format(root, pid or os.getpid(), extension)
+
+
+def _get_logger():
+    """ Returns the logger writing to the slow query log, creating it on
+    first use so that workers which never see a slow query do not open the
+    file. """
+    global _logger, _logger_pid
+
+    with _logger_lock:
+        # A logger created before the worker was forked writes to the file
+        # of its parent.
+        if _logger is None or _logger_pid != os.getpid():
+            path = get_path()
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            handler = RotatingFileHandler(
+                path, maxBytes=SLOW_QUERY_LOG['max_bytes'],
+                backupCount=SLOW_QUERY_LOG['backup_count'])
+            handler.setFormatter(logging.Formatter('%(message)s'))
+
+            logger = logging.getLogger('chatbot.slow_queries')
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            for old_handler in logger.handlers:
+                old_handler.close()
+            logger.handlers = [handler]
+            _logger = logger
+            _logger_pid = os.getpid()
+
+    return _logger
+
+
+def is_sampled():
+    """ Decides whether to trace a request. Tracing only keeps a few timings
+    and references per request, but can be limited to a fraction of the
+    requests through the sample rate. """
+    return random.random() < SLOW_QUERY_LOG['sample_rate']
+
+
+def log_if_slow(trace, stage='request', budget=BUDGET):
+    """ Writes the trace of a request to the slow query log if the given
+    stage took longer than the budget. Returns True if it was written. """
+    seconds = trace.stages.get(stage, 0.0)
+    if seconds <= budget:
+        return False
+
+    record = {
+        'time': datetime.datetime.utcnow().isoformat(),
+        'worker': os.getpid(),
+        'total_ms': round(seconds * 1000, 3),
+        'stages_ms': {name: round(value * 1000, 3)
+                      for name, value in trace.stages.items()},
+    }
+    record.update(trace.details)
+
+    _get_logger().info(json.dumps(record, ensure_ascii=False, default=str))
+    return True
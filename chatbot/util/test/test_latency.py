@@ -0,0 +1,16 @@
+from chatbot.util.latency import get_latencies, get_percentile
+
+
+def test_get_percentile():
+    latencies = list(range(1, 101))
+    assert get_percentile(latencies, 0) == 1
+    assert get_percentile(latencies, 50) == 50.5
+    assert get_percentile(latencies, 100) == 100
+
+
+def test_get_latencies():
+    latencies = get_latencies([4, 1, 3, 2])
+    assert latencies['mean'] == 2.5
+    assert latencies['p50'] == 2.5
+    assert latencies['max'] == 4
+    assert set(latencies) == {'mean', 'p50', 'p95', 'p99', 'max'}
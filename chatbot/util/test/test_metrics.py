@@ -0,0 +1,77 @@
+from chatbot.util.metrics import Histogram, Metrics, Trace, annotate, \
+    annotate_detail, split_trace, timed, traced
+
+
+def test_histogram_buckets():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in [0.05, 0.1, 0.5, 2.0]:
+        histogram.observe(value)
+
+    assert histogram.get_cumulative_counts() == [('0.1', 2), ('1.0', 3),
+                                                 ('+Inf', 4)]
+    assert histogram.count == 4
+
+
+def test_metrics_render():
+    metrics = Metrics.get_instance()
+    with timed('test_stage'):
+        pass
+    metrics.count_request('test_source')
+
+    text = metrics.render({'hits': 3, 'shared_hits': 1, 'misses': 1,
+                           'size': 2})
+    assert 'stage="test_stage",le="+Inf"} 1' in text
+    assert 'source="test_source"} 1' in text
+    assert 'chatbot_response_cache_hit_ratio' in text and '0.75' in text
+
+
+def test_trace():
+    with traced() as trace:
+        with timed('test_stage'):
+            annotate('detail', 1)
+        with timed('test_stage'):
+            pass
+
+    assert list(trace.stages) == ['test_stage']
+    assert trace.details == {'detail': 1}
+
+    # Nothing is traced outside the block.
+    annotate('detail', 2)
+    assert trace.details == {'detail': 1}
+
+
+def test_detailed_trace():
+    # Details are only collected in detailed traces.
+    with traced() as trace:
+        annotate_detail('detail', 1)
+    assert trace.details == {}
+
+    with traced(detailed=True) as trace:
+        annotate_detail('detail', 1)
+        annotate_detail('detail', 2)
+    assert trace.details == {'detail': [1, 2]}
+
+
+def test_split_trace():
+    with traced() as batch:
+        with timed('test_stage'):
+            annotate('detail', ['a', 'b', 'c'])
+
+    first, third = Trace(), Trace()
+    split_trace(batch, [first, None, third])
+
+    # Every request gets the stages of the batch, but only its own details.
+    assert first.stages == third.stages == batch.stages
+    assert first.details == {'detail': ['a']}
+    assert third.details == {'detail': ['c']}
+
+
+def test_unobserved_trace():
+    metrics = Metrics.get_instance()
+    with traced(observed=False) as trace:
+        with timed('test_unobserved_stage'):
+            pass
+
+    # The stage is only added to the trace.
+    assert 'test_unobserved_stage' in trace.stages
+    assert 'test_unobserved_stage' not in metrics.stages
@@ -0,0 +1,31 @@
+import json
+
+from chatbot.util import slow_query_log
+from chatbot.util.metrics import Trace
+
+
+def test_log_if_slow(tmpdir, monkeypatch):
+    monkeypatch.setitem(slow_query_log.SLOW_QUERY_LOG, 'file',
+                        str(tmpdir.join('slow_queries.jsonl')))
+    monkeypatch.setattr(slow_query_log, '_logger', None)
+
+    trace = Trace()
+    trace.add('request', 0.2)
+    trace.add('spelling', 0.15)
+    trace.details['query'] = 'hvor mye koster husleia'
+
+    assert not slow_query_log.log_if_slow(trace, budget=0.5)
+    assert slow_query_log.log_if_slow(trace, budget=0.1)
+
+    with open(slow_query_log.get_path()) as log_file:
+        record = json.loads(log_file.read())
+    assert record['query'] == 'hvor mye koster husleia'
+    assert record['stages_ms']['spelling'] == 150.0
+
+
+def test_get_path(monkeypatch):
+    monkeypatch.setitem(slow_query_log.SLOW_QUERY_LOG, 'file',
+                        'logs/slow_queries.jsonl')
+
+    # Every worker writes to a file of its own.
+    assert slow_query_log.get_path(42) == 'logs/slow_queries.42.jsonl'
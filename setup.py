@@ -4,4 +4,5 @@ setup(name='chatbot', version='1.5.1', packages=['chatbot/nlp',
                                                  'chatbot/model',
                                                  'chatbot/api',
                                                  'chatbot/util',
-                                                 'chatbot/scraper'])
+                                                 'chatbot/scraper',
+                                                 'chatbot/benchmark'])